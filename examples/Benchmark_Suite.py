@@ -0,0 +1,200 @@
+"""
+A reproducible benchmark suite for training and inference. Run with `python Benchmark_Suite.py run results.json` from this folder,
+and compare two runs with `python Benchmark_Suite.py diff old.json new.json` (it flags the tasks that got slower, used more memory or
+changed their accuracy, and exits with 1 if there are any).
+
+Each data set is split (with a fixed seed) into training, validation and test sets, and the suite times `generate_tree`, `prune_tree`
+(both methods, on the validation set), `tree_score`, `generate_forest` and `forest_classify`, measuring each one's peak memory and the
+resulting accuracy on the test set. The data sets are the ones in this folder, the accent dataset scaled up (see `scale_dataset`)
+and synthetic ones with any number of rows, numerical and categorical attributes and classes (see `synthetic_dataset`).
+All random numbers come from fixed seeds, so two runs of the same code give the same trees and accuracies on any machine.
+"""
+import pandas as pd
+import numpy as np
+import time
+import copy
+import contextlib
+import io
+import json
+import sys
+import os
+import platform
+import argparse
+
+from Part5 import generate_tree
+from ExtraPart1 import prune_tree,tree_score
+from ExtraPart2 import generate_forest,forest_classify,forest_score
+from Benchmarks import scale_dataset
+from Profiling import peak_rss,reset_peak_rss
+
+# The data sets in this folder, and their label columns
+BUNDLED = [('iris','iris.csv','class'),('trainq','trainq.csv','colour'),('train','train.csv','colour'),
+           ('accent','accent-recognition-mfcc--1/accent-mfcc-data-1.csv','language')]
+
+def synthetic_dataset(rows:int,columns:int=12,classes:int=5,categorical:int=2,seed:int=0)->pd.DataFrame:
+    """
+    * `rows:int`: How many rows the data set will have
+    * `columns:int`: How many numerical attributes it will have
+    * `classes:int`: How many classes there will be (in the `label` column)
+    * `categorical:int`: How many categorical attributes it will have (with 4 values each)
+    * `seed:int`: The seed for the random number generator
+    Generates a data set where each class's points are scattered around a random center, and each categorical attribute
+    is its point's class (shuffled into one of the 4 values) most of the time, and random otherwise
+    """
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(classes,size=rows)
+    centers = rng.normal(0,1,(classes,columns))
+    data = pd.DataFrame(centers[labels]+rng.normal(0,1.5,(rows,columns)),columns=[f"x{i}" for i in range(columns)])
+    for i in range(categorical):
+        mapping = rng.integers(4,size=classes)
+        noisy = rng.random(rows)<0.3
+        data[f"c{i}"] = np.array(['a','b','c','d'],dtype=object)[np.where(noisy,rng.integers(4,size=rows),mapping[labels])]
+    data['label'] = np.array([f"class{i}" for i in range(classes)],dtype=object)[labels]
+    return data
+
+def split_dataset(data:pd.DataFrame,seed:int=0)->tuple:
+    """
+    * `data:pd.DataFrame`: A data set
+    * `seed:int`: The seed for shuffling it
+    Splits a data set into training (60%), validation (20%) and test (20%) sets. Returns (train,validation,test)
+    """
+    order = np.random.default_rng(seed).permutation(len(data))
+    first,second = int(len(data)*0.6),int(len(data)*0.8)
+    return tuple(data.iloc[np.sort(part)].reset_index(drop=True) for part in (order[:first],order[first:second],order[second:]))
+
+def measure(function,repeat:int=1)->tuple:
+    """
+    * `function`: What we'll measure (it takes no arguments)
+    * `repeat:int`: How many times we'll run it
+    Runs a function, keeping its best wall time and the peak memory (resident set size) of the first run.
+    Returns (result,seconds,peak MiB)
+    """
+    reset_peak_rss()
+    best = None
+    for i in range(repeat):
+        #(Some functions print their progress, which we don't need here)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter()-start
+        if i == 0:
+            peak = peak_rss()
+        best = elapsed if best is None else min(best,elapsed)
+    return (result,best,peak)
+
+def bench_dataset(name:str,data:pd.DataFrame,label_column:str,forest_size:int=8,points:int=500,seed:int=0)->list:
+    """
+    * `name:str`: The data set's name in the results
+    * `data:pd.DataFrame`: The data set
+    * `label_column:str`: The column we'll use as our labels
+    * `forest_size:int`: How many trees the forests will have
+    * `points:int`: How many test points `forest_classify` will classify (one by one)
+    * `seed:int`: The seed for splitting the data set and growing the forest
+    Runs every task on a data set. Returns a list with each task's results
+    """
+    train,validation,test = split_dataset(data,seed)
+    #Small data sets are run a few times, so their times aren't just noise
+    repeat = 5 if len(data)<=10000 else 1
+    attributes = len(data.columns)-1
+    results = []
+    def record(task:str,seconds:float,peak:float,accuracy:float):
+        results.append({'dataset':name,'rows':len(data),'attributes':attributes,'classes':int(data[label_column].nunique()),
+                        'task':task,'seconds':seconds,'peak MiB':peak,'accuracy':accuracy})
+        print(f"{name:>24} {task:>20} {seconds:>10.4f}s {peak:>8.1f}MiB {accuracy:>9.4f}")
+    tree,seconds,peak = measure(lambda: generate_tree(train,label_column,2,0.05),repeat)
+    record('generate_tree',seconds,peak,tree_score(tree,test,label_column))
+    score,seconds,peak = measure(lambda: tree_score(tree,test,label_column),repeat)
+    record('tree_score',seconds,peak,score)
+    for method,threshold in [('score',1),('entropy',0.1)]:
+        #(Pruning changes the tree, so each run prunes a copy)
+        pruned,seconds,peak = measure(lambda: prune_tree(copy.deepcopy(tree),validation,label_column,method,threshold),repeat)
+        record(f"prune_tree ({method})",seconds,peak,tree_score(pruned,test,label_column))
+    (forest,average),seconds,peak = measure(lambda: generate_forest(train,label_column,forest_size,0.05,maxiterations=1,seed=seed),repeat)
+    record('generate_forest',seconds,peak,forest_score(forest,test,label_column))
+    sample = test.iloc[:points]
+    labels,seconds,peak = measure(lambda: [forest_classify(forest,point) for index,point in sample.iterrows()],repeat)
+    record('forest_classify',seconds,peak,float(np.mean(np.array(labels,dtype=object)==sample[label_column].to_numpy())))
+    return results
+
+def run_suite(path:str,sizes:tuple=(10000,100000),columns:int=12,classes:int=5,categorical:int=2,forest_size:int=8,seed:int=0)->dict:
+    """
+    * `path:str`: Where the results will be saved (as JSON)
+    * `sizes:tuple`: The row counts of the scaled up and synthetic data sets
+    * `columns:int`,`classes:int`,`categorical:int`: The shape of the synthetic data sets (see `synthetic_dataset`)
+    * `forest_size:int`: How many trees the forests will have
+    * `seed:int`: The seed for everything random
+    Runs the whole suite and saves its results, along with the machine and library versions they come from. Returns them
+    """
+    results = {'machine':{'python':platform.python_version(),'numpy':np.__version__,'pandas':pd.__version__,'platform':platform.platform(),
+                          'processor':platform.processor(),'cpus':os.cpu_count(),'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+                          'peak memory per task':reset_peak_rss()},
+               'settings':{'sizes':list(sizes),'columns':columns,'classes':classes,'categorical':categorical,'forest_size':forest_size,'seed':seed},
+               'results':[]}
+    print(f"{'dataset':>24} {'task':>20} {'time':>11} {'peak':>11} {'accuracy':>9}")
+    datasets = [(name,lambda path=path: pd.read_csv(path),label_column) for name,path,label_column in BUNDLED]
+    accents = BUNDLED[-1][1]
+    for size in sizes:
+        datasets.append((f"accent x{size}",lambda size=size: scale_dataset(pd.read_csv(accents),'language',size,seed),'language'))
+        datasets.append((f"synthetic {size}x{columns+categorical}x{classes}",lambda size=size: synthetic_dataset(size,columns,classes,categorical,seed),'label'))
+    for name,load,label_column in datasets:
+        results['results'] += bench_dataset(name,load(),label_column,forest_size,seed=seed)
+        #We save what we have after each data set, in case the big ones don't finish
+        with open(path,'w') as file:
+            json.dump(results,file,indent=1)
+    return results
+
+def diff_runs(old:str,new:str,tolerance:float=0.3,min_seconds:float=0.02,min_memory:float=5)->list:
+    """
+    * `old:str`,`new:str`: Two results files (see `run_suite`)
+    * `tolerance:float`: How much slower (or bigger) a task can get before it's flagged, as a fraction
+    * `min_seconds:float`,`min_memory:float`: Differences smaller than these (in seconds and MiB) are never flagged, since they're mostly noise
+    Compares two runs of the suite, task by task. Returns the regressions, as (dataset,task,what changed)
+    """
+    with open(old) as file:
+        before = json.load(file)
+    with open(new) as file:
+        after = json.load(file)
+    if before['machine']['platform']!=after['machine']['platform'] or before['machine']['cpus']!=after['machine']['cpus']:
+        print("(These runs come from different machines, so their times can't really be compared)")
+    previous = {(result['dataset'],result['task']):result for result in before['results']}
+    regressions = []
+    print(f"{'dataset':>24} {'task':>20} {'time':>8} {'memory':>8} {'accuracy':>9}")
+    for result in after['results']:
+        key = (result['dataset'],result['task'])
+        if key not in previous:
+            continue
+        old_result = previous[key]
+        flags = []
+        if result['seconds']>old_result['seconds']*(1+tolerance) and result['seconds']-old_result['seconds']>min_seconds:
+            flags.append('slower')
+        if result['peak MiB']>old_result['peak MiB']*(1+tolerance) and result['peak MiB']-old_result['peak MiB']>min_memory:
+            flags.append('more memory')
+        #With fixed seeds the accuracy shouldn't change at all, unless the algorithm did
+        if abs(result['accuracy']-old_result['accuracy'])>1e-9:
+            flags.append('accuracy changed')
+        regressions += [key+(flag,) for flag in flags]
+        print(f"{key[0]:>24} {key[1]:>20} {result['seconds']/max(old_result['seconds'],1e-9):>7.2f}x {result['peak MiB']/max(old_result['peak MiB'],1e-9):>7.2f}x "
+              f"{result['accuracy']-old_result['accuracy']:>+9.4f} {', '.join(flags)}")
+    print(f"{len(regressions)} regression(s)")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks training and inference on the bundled, scaled up and synthetic data sets")
+    commands = parser.add_subparsers(dest='command',required=True)
+    run = commands.add_parser('run',help="Runs the suite and saves its results")
+    run.add_argument('results')
+    run.add_argument('--sizes',type=int,nargs='+',default=[10000,100000],help="The scaled up and synthetic data sets' row counts (up to 1000000 or so)")
+    run.add_argument('--columns',type=int,default=12)
+    run.add_argument('--classes',type=int,default=5)
+    run.add_argument('--categorical',type=int,default=2)
+    run.add_argument('--forest-size',type=int,default=8)
+    run.add_argument('--seed',type=int,default=0)
+    diff = commands.add_parser('diff',help="Compares two runs and flags the regressions")
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--tolerance',type=float,default=0.3)
+    arguments = parser.parse_args()
+    if arguments.command == 'run':
+        run_suite(arguments.results,arguments.sizes,arguments.columns,arguments.classes,arguments.categorical,arguments.forest_size,arguments.seed)
+    else:
+        sys.exit(1 if diff_runs(arguments.old,arguments.new,arguments.tolerance) else 0)
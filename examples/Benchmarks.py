@@ -0,0 +1,584 @@
+"""
+Speed comparisons between the optimised functions and the guide's original implementations (see Reference.py).
+Run with `python Benchmarks.py` from this folder.
+"""
+import pandas as pd
+import numpy as np
+import math
+import time
+import tracemalloc
+import os
+import contextlib
+import io
+import copy
+import tempfile
+import pickle
+import multiprocessing
+import subprocess
+import sys
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import Reference
+from Part1 import set_entropy
+from Part2 import attribute_entropy
+from Part3 import num_attribute_entropy,minimum_num_attribute_entropy
+from Part4 import best_split
+from Part5 import generate_tree,generate_tree_levelwise,classify_point,annotate_tree
+from Dataset import encode_data
+from Compiled import compile_tree,compile_forest,predict_batch,forest_predict_batch,order_trees
+from Streaming import stream_tree
+from Storage import save_model,load_model
+from ExtraPart1 import prune_tree_score,prune_tree_entropy,prune_tree,tree_score
+from ExtraPart2 import generate_forest,forest_score
+from Profiling import peak_rss
+from Caching import SplitCache,caching
+from Online import OnlineTree,OnlineForest
+from Validation import parameter_grid,kfold_splits,cross_validate
+
+def scale_dataset(data:pd.DataFrame,label_column:str,rows:int,seed:int=0)->pd.DataFrame:
+    """
+    * `data:pd.DataFrame`: The data set we'll scale up
+    * `label_column:str`: The column we'll use as our labels
+    * `rows:int`: How many rows the new data set should have
+    * `seed:int`: The seed for the random number generator
+    Generates a bigger data set by resampling the rows and adding some noise to the numerical attributes
+    (so we also get more distinct values, like a real bigger set would have)
+    """
+    rng = np.random.default_rng(seed)
+    scaled = data.iloc[rng.integers(len(data),size=rows)].reset_index(drop=True)
+    for column in scaled.columns:
+        if column!=label_column and scaled[column].dtype!=object:
+            scaled[column] = scaled[column]+rng.normal(0,scaled[column].std()*0.01,rows)
+    return scaled
+
+def widen_dataset(data:pd.DataFrame,label_column:str,columns:int,seed:int=0)->pd.DataFrame:
+    """
+    * `data:pd.DataFrame`: The data set we'll widen
+    * `label_column:str`: The column we'll use as our labels
+    * `columns:int`: How many numerical attributes the new data set should have
+    * `seed:int`: The seed for the random number generator
+    Generates a data set with more attributes by adding noisy copies of the numerical ones
+    """
+    rng = np.random.default_rng(seed)
+    numerical = [column for column in data.columns if column!=label_column and data[column].dtype!=object]
+    wide = {f"{numerical[i%len(numerical)]}_{i}":data[numerical[i%len(numerical)]].to_numpy()+rng.normal(0,data[numerical[i%len(numerical)]].std()*0.1,len(data)) for i in range(columns)}
+    wide[label_column] = data[label_column].to_numpy()
+    return pd.DataFrame(wide)
+
+def timeit(function,*args,repeat:int=3)->float:
+    """
+    * `function`: The function we'll time
+    * `*args`: Its arguments
+    * `repeat:int`: How many times we'll run it
+    Returns the best wall time (in seconds) out of `repeat` runs
+    """
+    best = math.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best,time.perf_counter()-start)
+    return best
+
+def peak_memory(function,*args)->float:
+    """
+    * `function`: The function we'll measure
+    * `*args`: Its arguments
+    Returns the peak memory (in MiB) allocated by Python while running the function
+    """
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak/2**20
+
+def bench_entropy(sizes:tuple=(1000,10000,100000)):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    Compares each entropy function (on DataFrames) with the guide's original version
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    #A categorical attribute for `attribute_entropy`
+    accents['region'] = pd.cut(accents['X1'],8,labels=[f"r{i}" for i in range(8)]).astype(object)
+    print("Entropy functions vs. the original ones (accent dataset, scaled up)")
+    print(f"{'function':>22} {'rows':>8} {'original':>11} {'new':>11} {'speedup':>9}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        threshold = data['X2'].median()
+        for name,args in [('set_entropy',(data['language'],)),
+                          ('attribute_entropy',(data,'language','region')),
+                          ('num_attribute_entropy',(data,'language','X2',threshold))]:
+            old,new = getattr(Reference,name),globals()[name]
+            assert math.isclose(old(*args),new(*args),abs_tol=1e-12)
+            oldtime,newtime = timeit(old,*args),timeit(new,*args)
+            print(f"{name:>22} {size:>8} {oldtime*1000:>9.3f}ms {newtime*1000:>9.3f}ms {oldtime/newtime:>8.1f}x")
+
+def bench_num_split(sizes:tuple=(330,1000,3000),attribute:str='X1'):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    * `attribute:str`: The numerical attribute we'll search a threshold for
+    Compares the sorted sweep in `minimum_num_attribute_entropy` with the original bruteforce search
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    print("minimum_num_attribute_entropy (accent dataset, scaled up)")
+    print(f"{'rows':>8} {'bruteforce':>12} {'sorted':>12} {'speedup':>9}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        expected = Reference.minimum_num_attribute_entropy(data,'language',attribute)
+        result = minimum_num_attribute_entropy(data,'language',attribute)
+        assert result[1]==expected[1] and math.isclose(result[0],expected[0],abs_tol=1e-12),(result,expected)
+        old = timeit(Reference.minimum_num_attribute_entropy,data,'language',attribute,repeat=1)
+        new = timeit(minimum_num_attribute_entropy,data,'language',attribute)
+        print(f"{size:>8} {old:>11.4f}s {new:>11.4f}s {old/new:>8.1f}x")
+
+def _attribute_loop(data,label_column:str)->tuple:
+    #`best_split` as it was before the vectorized sweep: one attribute after another
+    entropy = set_entropy(data.label_codes())
+    entropies = [(attribute_entropy(data,label_column,attribute),None) if data.is_categorical(attribute) else minimum_num_attribute_entropy(data,label_column,attribute) for attribute in data.attributes]
+    gains = [(entropy-ent[0],i) for i,ent in enumerate(entropies)]
+    maximum = sorted(gains,reverse=True)[0]
+    return (data.attributes[maximum[1]],entropies[maximum[1]][1],maximum[0])
+
+def bench_columns(columns:tuple=(12,48,192,768),rows:tuple=(3000,300,30),jobs:int=4):
+    """
+    * `columns:tuple`: The numbers of attributes we'll test
+    * `rows:tuple`: The node sizes we'll test (a tree has many more small nodes than big ones)
+    * `jobs:int`: How many threads the threaded version uses
+    Compares `best_split` (on encoded data) evaluating one attribute after another, sweeping them all at once and sweeping them in threads
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',max(rows))
+    print(f"best_split vs. the number of attributes (accent dataset widened, {os.cpu_count()} CPUs)")
+    print(f"{'rows':>8} {'columns':>8} {'loop':>10} {'vectorized':>11} {f'{jobs} threads':>11} {'speedup':>9}")
+    for size in rows:
+        for width in columns:
+            data = encode_data(widen_dataset(accents.iloc[:size],'language',width),'language')
+            assert best_split(data,'language')==best_split(data,'language',jobs)==_attribute_loop(data,'language')
+            old = timeit(_attribute_loop,data,'language')
+            new = timeit(best_split,data,'language')
+            threaded = timeit(best_split,data,'language',jobs)
+            print(f"{size:>8} {width:>8} {old:>9.4f}s {new:>10.4f}s {threaded:>10.4f}s {old/min(new,threaded):>8.1f}x")
+
+def bench_cache(size:int=5000,forest_size:int=16,seeds:tuple=(0,1,2,3)):
+    """
+    * `size:int`: The data set size
+    * `forest_size:int`: How many trees the forests will have
+    * `seeds:tuple`: The forests' seeds (a forest's retries depend a lot on its seed, so we add up a few)
+    Compares growing trees with and without a split cache: many trees on the same rows (a `mindepth`×`info_thresh` grid),
+    where most nodes are repeated, and forests with many retries, where the cache only pays off if each training bag is tried twice (`bag_tries`)
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',size)
+    data = encode_data(accents,'language')
+    grid = [(mindepth,info_thresh) for mindepth in (0,2,4) for info_thresh in (0.01,0.02,0.05,0.1,0.2)]
+    print("Split cache (accent dataset)")
+    print(f"{'task':>28} {'no cache':>10} {'cache':>10} {'hit rate':>9} {'cache size':>11}")
+    start = time.perf_counter()
+    expected = [generate_tree(data,'language',mindepth,info_thresh) for mindepth,info_thresh in grid]
+    old = time.perf_counter()-start
+    with caching(SplitCache()) as cache:
+        start = time.perf_counter()
+        assert [generate_tree(data,'language',mindepth,info_thresh) for mindepth,info_thresh in grid]==expected
+        new = time.perf_counter()-start
+    stats = cache.stats()
+    print(f"{f'{len(grid)} trees, {size} rows':>28} {old:>9.3f}s {new:>9.3f}s {stats['hit rate']:>8.1%} {stats['bytes']/2**20:>8.1f}MiB")
+    #The cache alone gives the same forest, but each new tree has a new bag, so there's little to reuse. Trying each bag twice does reuse
+    #the retried trees' splits, but they aren't the same trees, and a forest's retries can go quite differently, so we compare the time
+    #per tree grown (as well as the total) and how good the forests are
+    print(f"{'forest':>28} {'no cache':>10} {'cache':>10} {'hit rate':>9} {'2 tries':>10} {'hit rate':>9} {'trees grown':>12}")
+    seconds,trees,scores = np.zeros(3),np.zeros(3,dtype=int),[[],[],[]]
+    for seed in seeds:
+        times,grown,rates,forests = [0,0,0],[0,0,0],[0,0,0],[None,None,None]
+        for i,(cache,bag_tries) in enumerate([(None,1),(SplitCache(),1),(SplitCache(),2)]):
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                start = time.perf_counter()
+                forests[i],average = generate_forest(accents,'language',forest_size,0.01,maxiterations=20,seed=seed,cache=cache,bag_tries=bag_tries)
+                times[i] = time.perf_counter()-start
+            grown[i] = sum(int(line.split()[3]) for line in output.getvalue().splitlines() if line.startswith('Forest generation'))
+            rates[i] = cache.stats()['hit rate'] if cache is not None else 0
+            scores[i].append(average[-1][3])
+        assert list(forests[0])==list(forests[1])
+        seconds += times
+        trees += grown
+        print(f"{f'seed {seed}, {forest_size} trees':>28} {times[0]:>9.3f}s {times[1]:>9.3f}s {rates[1]:>8.1%} {times[2]:>9.3f}s {rates[2]:>8.1%} {grown[0]:>5} {grown[2]:>5}")
+    print(f"{'per tree grown':>28} {seconds[0]/trees[0]*1000:>8.1f}ms {seconds[1]/trees[1]*1000:>8.1f}ms {'':>9} {seconds[2]/trees[2]*1000:>8.1f}ms")
+    print(f"{'out-of-bag accuracy':>28} {np.mean(scores[0]):>10.4f} {np.mean(scores[1]):>10.4f} {'':>9} {np.mean(scores[2]):>10.4f}")
+
+def bench_online(rows:int=50000,batch:int=2000,forest_size:int=8):
+    """
+    * `rows:int`: How many labelled rows arrive, in total
+    * `batch:int`: How many arrive at a time
+    * `forest_size:int`: How many trees the forest will have
+    Compares updating a tree and a forest with each new batch (see `OnlineTree` and `OnlineForest`) with generating them again
+    from all the rows so far (only at the end, since it's slow), on a synthetic data stream
+    """
+    from Benchmark_Suite import synthetic_dataset
+    data = synthetic_dataset(rows+10000,seed=1)
+    stream,test = data.iloc[:rows],data.iloc[rows:]
+    first = stream.iloc[:batch]
+    with contextlib.redirect_stdout(io.StringIO()):
+        forest = generate_forest(first,'label',forest_size,0.05,maxiterations=0,seed=0)[0]
+    online = [('tree',OnlineTree(generate_tree(first,'label',2,0.05,bins=64),first,'label',2,0.05)),
+              (f"forest, {forest_size} trees",OnlineForest(forest,first,'label',2,0.05,seed=0))]
+    print(f"Updating with {rows} rows in batches of {batch} (synthetic dataset)")
+    print(f"{'model':>16} {'first update':>13} {'last update':>12} {'accuracy':>9} {'regenerated':>12} {'accuracy':>9}")
+    for name,model in online:
+        times = []
+        for start in range(batch,rows,batch):
+            times.append(timeit(model.update,stream.iloc[start:start+batch],repeat=1))
+        if isinstance(model,OnlineTree):
+            score = tree_score(model.tree,test,'label')
+            regenerating = timeit(lambda: generate_tree(stream,'label',2,0.05,bins=64),repeat=1)
+            regenerated = tree_score(generate_tree(stream,'label',2,0.05,bins=64),test,'label')
+        else:
+            score = forest_score(model.forest,test,'label')
+            with contextlib.redirect_stdout(io.StringIO()):
+                regenerating = timeit(lambda: generate_forest(stream,'label',forest_size,0.05,maxiterations=0,seed=0),repeat=1)
+                regenerated = forest_score(generate_forest(stream,'label',forest_size,0.05,maxiterations=0,seed=0)[0],test,'label')
+        print(f"{name:>16} {times[0]:>12.3f}s {times[-1]:>11.3f}s {score:>9.4f} {regenerating:>11.2f}s {regenerated:>9.4f}")
+
+def bench_grid(size:int=2000,k:int=5,jobs:tuple=(1,4)):
+    """
+    * `size:int`: The data set size
+    * `k:int`: How many folds there'll be
+    * `jobs:tuple`: The numbers of processes we'll try
+    Compares a grid search over `mindepth`, `info_thresh` and pruning done one tree at a time (the data set filtered with pandas for each fold,
+    every tree grown from scratch and scored with `classify_point`) with `cross_validate`
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',size)
+    grid = parameter_grid(mindepth=[1,2,3],info_thresh=[0.02,0.05,0.1],prune=[None,'score'])
+    splits = kfold_splits(len(accents),k)
+    def one_by_one():
+        for parameters in grid:
+            for train,test in splits:
+                train,test = accents.iloc[train],accents.iloc[test]
+                if parameters['prune']:
+                    train,pruning = train.iloc[:int(len(train)*0.75)],train.iloc[int(len(train)*0.75):]
+                tree = generate_tree(train,'language',parameters['mindepth'],parameters['info_thresh'])
+                if parameters['prune']:
+                    tree = prune_tree(tree,pruning,'language','score')
+                np.mean([classify_point(point,tree)==point['language'] for i,point in test.iterrows()])
+    print(f"Grid search with {len(grid)} combinations and {k} folds ({size} rows, {os.cpu_count()} CPUs available)")
+    old = timeit(one_by_one,repeat=1)
+    print(f"{'one by one':>16} {old:>8.2f}s")
+    #The results must be the same for any number of processes (only the timings change)
+    compared = ['combination','fold','score','nodes']
+    expected = None
+    for n_jobs in jobs:
+        start = time.perf_counter()
+        results = cross_validate(accents,'language',grid,splits,n_jobs)
+        new = time.perf_counter()-start
+        if expected is None:
+            expected = results
+        assert results[compared].equals(expected[compared])
+        print(f"{f'{n_jobs} process(es)':>16} {new:>8.2f}s {old/new:>8.1f}x")
+
+def bench_presort(sizes:tuple=(330,3000,10000)):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    Compares `generate_tree` with and without presorting on the accent dataset (scaled up)
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    print("generate_tree (accent dataset, scaled up, mindepth=2, info_thresh=0.05)")
+    print(f"{'rows':>8} {'default':>10} {'presort':>10} {'default mem':>12} {'presort mem':>12}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        assert generate_tree(data,'language',2,0.05)==generate_tree(data,'language',2,0.05,presort=True)
+        old = timeit(generate_tree,data,'language',2,0.05,repeat=1)
+        new = timeit(generate_tree,data,'language',2,0.05,0,True,repeat=1)
+        oldmem = peak_memory(generate_tree,data,'language',2,0.05)
+        newmem = peak_memory(generate_tree,data,'language',2,0.05,0,True)
+        print(f"{size:>8} {old:>9.3f}s {new:>9.3f}s {oldmem:>9.1f}MiB {newmem:>9.1f}MiB")
+
+def bench_encoded(sizes:tuple=(330,1000)):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    Compares `generate_tree` (which encodes the data set once) with the original DataFrame-slicing version
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    print("generate_tree vs. the original DataFrame version (accent dataset, scaled up, mindepth=2, info_thresh=0.05)")
+    print(f"{'rows':>8} {'original':>10} {'encoded':>10} {'speedup':>9}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        assert generate_tree(data,'language',2,0.05)==Reference.generate_tree(data,'language',2,0.05)
+        old = timeit(Reference.generate_tree,data,'language',2,0.05,repeat=1)
+        new = timeit(generate_tree,data,'language',2,0.05,repeat=1)
+        print(f"{size:>8} {old:>9.3f}s {new:>9.3f}s {old/new:>8.1f}x")
+
+def bench_binned(sizes:tuple=(10000,100000),bins:int=64):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    * `bins:int`: How many bins the numerical attributes are split into
+    Compares the exact (presorted) `generate_tree` with the binned one, in time and in score on a separate test set
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    test = scale_dataset(accents,'language',5000,seed=1)
+    print(f"generate_tree exact vs. {bins} bins (accent dataset, scaled up, mindepth=2, info_thresh=0.01)")
+    print(f"{'rows':>8} {'exact':>10} {'binned':>10} {'speedup':>9} {'exact score':>12} {'binned score':>13}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        start = time.perf_counter()
+        exact = generate_tree(data,'language',2,0.01,presort=True)
+        old = time.perf_counter()-start
+        start = time.perf_counter()
+        binned = generate_tree(data,'language',2,0.01,bins=bins)
+        new = time.perf_counter()-start
+        print(f"{size:>8} {old:>9.3f}s {new:>9.3f}s {old/new:>8.1f}x {tree_score(exact,test,'language'):>12.4f} {tree_score(binned,test,'language'):>13.4f}")
+
+def bench_levelwise(sizes:tuple=(20000,100000),bins:int=64,max_leaves:int=16):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    * `bins:int`: How many bins the binned trees use
+    * `max_leaves:int`: The leaf budget for the last column
+    Compares the recursive `generate_tree` with `generate_tree_levelwise` (exact and binned) on the accent dataset (scaled up)
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    print(f"generate_tree, recursive vs. level-wise (accent dataset, scaled up, mindepth=2, info_thresh=0.05, {bins} bins)")
+    print(f"{'rows':>8} {'recursive':>10} {'levelwise':>10} {'rec. bins':>10} {'lw. bins':>10} {f'{max_leaves} leaves':>10}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        assert generate_tree(data,'language',2,0.05)==generate_tree_levelwise(data,'language',2,0.05)
+        assert generate_tree(data,'language',2,0.05,bins=bins)==generate_tree_levelwise(data,'language',2,0.05,bins=bins)
+        times = [timeit(generate_tree,data,'language',2,0.05,repeat=1),
+                 timeit(generate_tree_levelwise,data,'language',2,0.05,repeat=1),
+                 timeit(generate_tree,data,'language',2,0.05,0,False,bins,repeat=1),
+                 timeit(generate_tree_levelwise,data,'language',2,0.05,0,bins,repeat=1),
+                 timeit(generate_tree_levelwise,data,'language',2,0.05,max_leaves,bins,repeat=1)]
+        print(f"{size:>8} "+" ".join(f"{time:>9.3f}s" for time in times))
+
+def _train_in_memory(path:str,label_column:str,bins:int)->tuple:
+    #Reads the whole file and grows a tree. Returns (tree,peak RSS in MiB)
+    tree = generate_tree(pd.read_csv(path),label_column,2,0.01,bins=bins)
+    return (tree,peak_rss())
+
+def _train_streaming(path:str,label_column:str,bins:int,capacity:int=2**20)->tuple:
+    #Grows a tree reading the file in chunks. Returns (tree,peak RSS in MiB)
+    tree = stream_tree(path,label_column,2,0.01,bins=bins,capacity=capacity)
+    return (tree,peak_rss())
+
+def _idle()->tuple:
+    #Just the imports. Returns (None,peak RSS in MiB)
+    return (None,peak_rss())
+
+def bench_streaming(sizes:tuple=(100000,1000000),bins:int=64):
+    """
+    * `sizes:tuple`: The data set sizes we'll test
+    * `bins:int`: How many bins the numerical attributes are split into
+    Compares the peak memory (RSS) of growing a tree from a CSV file in memory and in chunks with `stream_tree`
+    (keeping all values for the bins, so it's the same tree, and keeping only 2^16 of them, for the approximate bins).
+    Each one runs in a new process, since the peak can't be reset
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    context = multiprocessing.get_context('spawn')
+    def run(function,*args):
+        with ProcessPoolExecutor(1,mp_context=context) as pool:
+            start = time.perf_counter()
+            result = pool.submit(function,*args).result()
+            return result+(time.perf_counter()-start,)
+    print(f"generate_tree in memory vs. stream_tree, {bins} bins (accent dataset, scaled up; {run(_idle)[1]:.0f}MiB just for the imports)")
+    print(f"{'rows':>8} {'csv size':>10} {'memory RSS':>11} {'stream RSS':>11} {'2^16 RSS':>9} {'memory time':>12} {'stream time':>12}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            path = os.path.join(folder,'data.csv')
+            scale_dataset(accents,'language',size).to_csv(path,index=False)
+            tree,inmemory,oldtime = run(_train_in_memory,path,'language',bins)
+            streamed,streaming,newtime = run(_train_streaming,path,'language',bins)
+            small = run(_train_streaming,path,'language',bins,2**16)[1]
+            assert tree==streamed
+            print(f"{size:>8} {os.path.getsize(path)/2**20:>7.0f}MiB {inmemory:>8.0f}MiB {streaming:>8.0f}MiB {small:>6.0f}MiB {oldtime:>11.2f}s {newtime:>11.2f}s")
+
+def bench_predict(sizes:tuple=(1000,10000,100000)):
+    """
+    * `sizes:tuple`: How many points we'll classify
+    Compares classifying points one by one with `classify_point` and all at once with `predict_batch`
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    tree = generate_tree(accents,'language',2,0.01)
+    compiled = compile_tree(tree)
+    print(f"Classifying points with a {len(compiled)}-node tree (accent dataset, scaled up)")
+    print(f"{'rows':>8} {'classify_point':>15} {'predict_batch':>14} {'speedup':>9}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        old = timeit(lambda: [classify_point(point,tree) for i,point in data.iterrows()],repeat=1)
+        new = timeit(predict_batch,compiled,data)
+        print(f"{size:>8} {old:>14.3f}s {new:>13.4f}s {old/new:>8.1f}x")
+
+def bench_forest(jobs:tuple=(1,2,4,8,16),size:int=3000,forest_size:int=16):
+    """
+    * `jobs:tuple`: The numbers of processes we'll test
+    * `size:int`: The data set size
+    * `forest_size:int`: How many trees the forest will have
+    Compares `generate_forest` using different numbers of processes (one iteration, fixed seed)
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',size)
+    print(f"generate_forest with {forest_size} trees ({size} rows, {os.cpu_count()} CPUs available)")
+    print(f"{'n_jobs':>8} {'time':>10} {'speedup':>9}")
+    first = None
+    for n_jobs in jobs:
+        #The forest prints its progress, which we don't need here
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            forest = generate_forest(accents,'language',forest_size,0.05,maxiterations=0,n_jobs=n_jobs,seed=0)
+            elapsed = time.perf_counter()-start
+        if first is None:
+            first = (forest,elapsed)
+        #The seed makes the forest the same for any number of processes
+        assert list(forest[0])==list(first[0][0]) and forest[1]==first[0][1]
+        print(f"{n_jobs:>8} {elapsed:>9.3f}s {first[1]/elapsed:>8.1f}x")
+
+def bench_prune(sizes:tuple=(1000,3000)):
+    """
+    * `sizes:tuple`: The validation set sizes we'll test
+    Compares `prune_tree_score` (one pass down the tree) with the original version (which scores the whole tree for each node)
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    tree = generate_tree(scale_dataset(accents,'language',3000,seed=1),'language',2,0.01)
+    print(f"prune_tree_score on a {len(compile_tree(tree))}-node tree (accent dataset, scaled up)")
+    print(f"{'rows':>8} {'original':>10} {'one pass':>10} {'speedup':>9}")
+    for size in sizes:
+        data = scale_dataset(accents,'language',size)
+        assert prune_tree_score(copy.deepcopy(tree),data,'language')==Reference.prune_tree_score(copy.deepcopy(tree),data,'language')
+        old = timeit(lambda: Reference.prune_tree_score(copy.deepcopy(tree),data,'language'),repeat=1)
+        new = timeit(lambda: prune_tree_score(copy.deepcopy(tree),data,'language'))
+        print(f"{size:>8} {old:>9.3f}s {new:>9.4f}s {old/new:>8.1f}x")
+
+def bench_prune_counts(thresholds:tuple=(0.01,0.02,0.05,0.1,0.2,0.3,0.5,1),size:int=3000):
+    """
+    * `thresholds:tuple`: The information gain thresholds we'll prune with
+    * `size:int`: The validation set size
+    Compares pruning a tree by entropy at several thresholds with `prune_tree_entropy` (which filters the data set at every node)
+    with annotating the tree with the validation set's class counts once and pruning from them (see `prune_tree_counts`)
+    """
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    tree = generate_tree(scale_dataset(accents,'language',3000,seed=1),'language',2,0.01)
+    data = scale_dataset(accents,'language',size)
+    print(f"prune_tree_entropy at {len(thresholds)} thresholds on a {len(compile_tree(tree))}-node tree ({size} rows)")
+    old = timeit(lambda: [prune_tree_entropy(copy.deepcopy(tree),data,'language',threshold) for threshold in thresholds],repeat=1)
+    annotating = timeit(annotate_tree,tree,data,'language')
+    annotated = annotate_tree(tree,data,'language')
+    new = timeit(lambda: [prune_tree(annotated,threshold=threshold) for threshold in thresholds])
+    print(f"{'original':>10} {old:.3f}s, annotating {annotating:.4f}s and pruning from the counts {new:.4f}s ({old/(annotating+new):.1f}x)")
+
+def bench_forest_memory(sizes:tuple=(4,16,32),rows:int=10000):
+    """
+    * `sizes:tuple`: The forest sizes we'll test
+    * `rows:int`: The data set size
+    Measures the peak memory of `generate_forest` (two iterations, fixed seed) for different forest sizes.
+    The bags are lists of rows of one shared data set, so it shouldn't grow with the forest
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',rows)
+    print(f"generate_forest peak memory ({rows} rows, {accents.memory_usage(deep=True).sum()/2**20:.1f}MiB as a DataFrame)")
+    print(f"{'trees':>8} {'peak':>10} {'time':>9}")
+    for forest_size in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            grow = lambda: generate_forest(accents,'language',forest_size,0.05,maxiterations=1,seed=0)
+            elapsed = timeit(grow,repeat=1)
+            peak = peak_memory(grow)
+        print(f"{forest_size:>8} {peak:>7.1f}MiB {elapsed:>8.2f}s")
+
+def bench_voting(forest_size:int=128,rows:int=20000,sizes:tuple=(1000,100000)):
+    """
+    * `forest_size:int`: How many trees the forest will have
+    * `rows:int`: The training set size
+    * `sizes:tuple`: How many points we'll classify
+    Compares `forest_predict_batch` evaluating every tree with stopping early for decided points,
+    in the forest's order and with the trees ranked by `order_trees` on a validation set
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',2*rows)
+    train,validation = accents.iloc[:rows],accents.iloc[rows:]
+    rng = np.random.default_rng(0)
+    forest = compile_forest([generate_tree(train.iloc[rng.integers(rows,size=rows//4)],'language',2,0.05,bins=64) for i in range(forest_size)])
+    order = order_trees(forest,validation.iloc[:2000],'language')
+    print(f"Classifying points with a {forest_size}-tree forest")
+    print(f"{'rows':>8} {'all trees':>10} {'early exit':>11} {'ranked':>10} {'speedup':>9}")
+    for size in sizes:
+        points = scale_dataset(validation,'language',size,1)
+        expected = forest_predict_batch(forest,points)
+        assert (forest_predict_batch(forest,points,early_exit=True)==expected).all()
+        assert (forest_predict_batch(forest,points,order,True)==expected).all()
+        full = timeit(forest_predict_batch,forest,points)
+        early = timeit(lambda: forest_predict_batch(forest,points,early_exit=True))
+        ranked = timeit(lambda: forest_predict_batch(forest,points,order,True))
+        print(f"{size:>8} {full:>9.3f}s {early:>10.3f}s {ranked:>9.3f}s {full/ranked:>8.1f}x")
+
+def bench_storage(forest_size:int=64,rows:int=20000):
+    """
+    * `forest_size:int`: How many trees the forest will have
+    * `rows:int`: The data set size (bigger sets make bigger trees)
+    Compares loading a forest saved with pickle (and compiling it, which batch prediction needs) with loading one saved by `save_model`
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',rows)
+    rng = np.random.default_rng(0)
+    forest = [generate_tree(accents.iloc[rng.integers(rows,size=rows)],'language',2,0.001,bins=64) for i in range(forest_size)]
+    points = accents.iloc[:1000]
+    with tempfile.TemporaryDirectory() as folder:
+        pickled,saved = os.path.join(folder,'forest.pkl'),os.path.join(folder,'forest.c45m')
+        with open(pickled,'wb') as file:
+            pickle.dump(forest,file)
+        save_model(forest,saved)
+        def unpickle():
+            with open(pickled,'rb') as file:
+                return compile_forest(pickle.load(file))
+        expected = forest_predict_batch(forest,points)
+        print(f"Loading a {forest_size}-tree forest with {sum(len(tree) for tree in compile_forest(forest))} nodes")
+        print(f"{'format':>16} {'size':>10} {'load':>10} {'load+predict':>13}")
+        for name,path,load in [('pickle',pickled,unpickle),('save_model',saved,lambda: load_model(saved,mmap=False)),('save_model+mmap',saved,lambda: load_model(saved))]:
+            assert (forest_predict_batch(load(),points)==expected).all()
+            loading = timeit(load,repeat=5)
+            predicting = timeit(lambda: forest_predict_batch(load(),points),repeat=5)
+            print(f"{name:>16} {os.path.getsize(path)/2**10:>7.0f}KiB {loading*1000:>8.2f}ms {predicting*1000:>11.2f}ms")
+
+def bench_startup(forest_size:int=32,rows:int=5000,points:int=10,repeat:int=5):
+    """
+    * `forest_size:int`: How many trees the forest will have
+    * `rows:int`: The data set size (bigger sets make bigger trees)
+    * `points:int`: How many points the first prediction classifies
+    * `repeat:int`: How many fresh processes each way is timed in (the best one is kept)
+    Compares how long a new process takes to import what it needs to classify with a saved forest and to make its first prediction:
+    with the training modules (pandas, and matplotlib like `Utility` used to import) and with Inference.py (only NumPy)
+    """
+    accents = scale_dataset(pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv'),'language',rows)
+    rng = np.random.default_rng(0)
+    forest = [generate_tree(accents.iloc[rng.integers(rows,size=rows)],'language',2,0.05) for i in range(forest_size)]
+    records = accents.drop(columns=['language']).iloc[:points].to_dict('records')
+    #Each way is a script that prints its import and first prediction times (and which heavy modules it loaded), as JSON
+    ways = [('training+matplotlib',"import pandas as pd\nimport matplotlib.pyplot\nfrom Storage import load_model\nfrom Compiled import forest_predict_batch",
+             "forest_predict_batch(load_model(path),pd.DataFrame.from_records(records))"),
+            ('training',"import pandas as pd\nfrom Storage import load_model\nfrom Compiled import forest_predict_batch",
+             "forest_predict_batch(load_model(path),pd.DataFrame.from_records(records))"),
+            ('Inference',"from Inference import load_model,predict","predict(load_model(path),records)")]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder,'forest.c45m')
+        save_model(forest,path)
+        print(f"Starting up to classify {points} points with a saved {forest_size}-tree forest")
+        print(f"{'imports':>20} {'import':>10} {'first prediction':>17} {'process':>10} {'loaded':>18}")
+        for name,imports,prediction in ways:
+            script = (f"import time,sys,json\nstart = time.perf_counter()\n{imports}\nimported = time.perf_counter()\n"
+                      f"path,records = {path!r},{records!r}\n{prediction}\n"
+                      "print(json.dumps([imported-start,time.perf_counter()-imported,[name for name in ('pandas','matplotlib') if name in sys.modules]]))")
+            best = None
+            for i in range(repeat):
+                start = time.perf_counter()
+                output = subprocess.run([sys.executable,'-c',script],capture_output=True,text=True,check=True,cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+                times = json.loads(output)+[time.perf_counter()-start]
+                best = times if best is None or times[-1]<best[-1] else best
+            print(f"{name:>20} {best[0]*1000:>8.1f}ms {best[1]*1000:>15.1f}ms {best[3]*1000:>8.1f}ms {','.join(best[2]) or '-':>18}")
+
+if __name__ == '__main__':
+    bench_entropy()
+    bench_num_split()
+    bench_columns()
+    bench_cache()
+    bench_online()
+    bench_grid()
+    bench_presort()
+    bench_encoded()
+    bench_binned()
+    bench_levelwise()
+    bench_streaming()
+    bench_predict()
+    bench_prune()
+    bench_prune_counts()
+    bench_voting()
+    bench_storage()
+    bench_startup()
+    bench_forest()
+    bench_forest_memory()
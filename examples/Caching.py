@@ -0,0 +1,109 @@
+"""
+An optional cache for `best_split`'s attribute entropies, for when trees are grown many times on the same rows
+(with different `mindepth`/`info_thresh`, for example): each node's rows and attribute are fingerprinted,
+and if that (subset,attribute) was already evaluated, its entropy and threshold are reused.
+
+Use it with `with caching(SplitCache()) as cache:` around the tree building, and look at `cache.stats()` afterwards.
+Only encoded data sets (which `generate_tree` always uses) are cached.
+"""
+import numpy as np
+import hashlib
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# The cache `best_split` uses, if any
+_active = None
+# Each data set's fingerprint (of all its arrays), so it's only calculated once: by its labels array's id, along with a reference to it
+# (so we know the id wasn't reused by another array)
+_fingerprints = dict()
+
+class SplitCache:
+    """
+    A least recently used cache of attribute entropies.
+    * `max_bytes`: About how much memory the cache can use. When it's full, the entries used longest ago are dropped
+    * `hits`,`misses`,`evictions`: How many entries were found, not found and dropped
+    """
+    def __init__(self,max_bytes:int=64*2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    def __len__(self)->int:
+        return len(self.entries)
+    def get(self,key:tuple):
+        """
+        * `key:tuple`: What we're looking for
+        Returns the cached value (or None), marking it as recently used
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+    def put(self,key:tuple,value):
+        """
+        * `key:tuple`: The value's key
+        * `value`: What we're caching
+        Caches a value, dropping the least recently used ones if there isn't enough space
+        """
+        if key in self.entries:
+            return
+        self.entries[key] = value
+        self.bytes += _size(key,value)
+        while self.bytes>self.max_bytes and self.entries:
+            old_key,old_value = self.entries.popitem(last=False)
+            self.bytes -= _size(old_key,old_value)
+            self.evictions += 1
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+    def stats(self)->dict:
+        """
+        Returns how many lookups found their entry (in total and as a fraction), how many didn't, how many entries were dropped
+        and how many there are (and about how much memory they use, in bytes)
+        """
+        lookups = self.hits+self.misses
+        return {'hits':self.hits,'misses':self.misses,'hit rate':self.hits/lookups if lookups else 0,
+                'evictions':self.evictions,'entries':len(self.entries),'bytes':self.bytes}
+
+def _size(key:tuple,value)->int:
+    #About how much memory an entry takes: its key (a fingerprint and an attribute), its value (an entropy and a threshold)
+    #and the dict's slot. They're all alike, so we don't need to measure each object
+    return 300+len(key[0])+len(key[1])
+
+@contextmanager
+def caching(cache:SplitCache):
+    """
+    * `cache:SplitCache`: The cache we'll use
+    Makes `best_split` use a cache inside the `with` block. Yields the cache
+    """
+    global _active
+    previous,_active = _active,cache
+    try:
+        yield cache
+    finally:
+        _active = previous
+
+def fingerprint(data)->bytes:
+    """
+    * `data:EncodedData`: A (sub)set of an encoded data set
+    Returns a fingerprint of its contents: the whole set's (its labels, attributes and their values) and the rows in this subset
+    """
+    reference,whole = _fingerprints.get(id(data.labels),(None,None))
+    if reference is None or reference() is not data.labels:
+        digest = hashlib.blake2b(data.labels.tobytes(),digest_size=16)
+        digest.update(repr(list(data.classes)).encode())
+        for attribute,column in data.columns.items():
+            digest.update(repr((attribute,column.dtype.str,list(data.values.get(attribute,[])))).encode())
+            digest.update(np.ascontiguousarray(column).tobytes())
+        whole = digest.digest()
+        #(We forget the data sets that are gone)
+        for key in [key for key,(reference,old) in _fingerprints.items() if reference() is None]:
+            del _fingerprints[key]
+        _fingerprints[id(data.labels)] = (weakref.ref(data.labels),whole)
+    return whole+hashlib.blake2b(np.ascontiguousarray(data.rows).tobytes(),digest_size=16).digest()
@@ -0,0 +1,159 @@
+import pandas as pd
+import numpy as np
+import math
+from Dataset import EncodedData,column_values
+from Profiling import timed
+from Inference import CompiledTree,encode_records,route_points,predict_codes,vote_codes,value_key
+
+def _position(items:list,item)->int:
+    #Finds an item in a list, appending it if it's not there yet
+    if item not in items:
+        items.append(item)
+    return items.index(item)
+
+def _compile_node(tree:tuple,nodes:dict,branches:list,attributes:list,values:dict,classes:list)->int:
+    #Pruning can leave a missing branch behind for a moment, and there's no way to classify anything through it
+    if tree is None:
+        return -1
+    #We reserve this node's position
+    node = len(nodes['feature'])
+    for key,default in (('feature',-1),('threshold',math.nan),('left',-1),('right',-1),('leaf',-1)):
+        nodes[key].append(default)
+    # If there's no children, it's a leaf.
+    if not tree[2]:
+        nodes['leaf'][node] = _position(classes,tree[0])
+        return node
+    nodes['feature'][node] = _position(attributes,tree[0])
+    # If it's numerical
+    if tree[1] is not None:
+        nodes['threshold'][node] = tree[1]
+        nodes['left'][node] = _compile_node(tree[2]['lessereq'],nodes,branches,attributes,values,classes)
+        nodes['right'][node] = _compile_node(tree[2]['greater'],nodes,branches,attributes,values,classes)
+    else:
+        #We make a table with a position for each possible value of the attribute
+        possible = values.setdefault(tree[0],[])
+        codes = [_position(possible,value_key(value)) for value in tree[2]]
+        nodes['left'][node] = len(branches)
+        nodes['right'][node] = len(possible)
+        branches.extend([-1]*len(possible))
+        #And fill it with the children
+        for code,value in zip(codes,tree[2]):
+            branches[nodes['left'][node]+code] = _compile_node(tree[2][value],nodes,branches,attributes,values,classes)
+    return node
+
+@timed('compile_tree')
+def compile_tree(tree:tuple,attributes:list=None,values:dict=None,classes:list=None)->CompiledTree:
+    """
+    * `tree:tuple`: A tree
+    * `attributes:list`,`values:dict`,`classes:list`: Existing attribute, value and label tables to reuse (and extend)
+    Flattens a tree into a `CompiledTree`
+    """
+    attributes = [] if attributes is None else attributes
+    values = dict() if values is None else values
+    classes = [] if classes is None else classes
+    nodes = {key:[] for key in ('feature','threshold','left','right','leaf')}
+    branches = []
+    _compile_node(tree,nodes,branches,attributes,values,classes)
+    return CompiledTree(np.array(nodes['feature'],dtype=np.int32),np.array(nodes['threshold'],dtype=float),
+                        np.array(nodes['left'],dtype=np.int32),np.array(nodes['right'],dtype=np.int32),
+                        np.array(nodes['leaf'],dtype=np.int32),np.array(branches,dtype=np.int32),attributes,values,classes)
+
+@timed('compile_forest')
+def compile_forest(forest:list)->list:
+    """
+    * `forest:list`: A forest
+    Compiles all trees in a forest sharing the same attribute, value and label tables
+    (so the data only has to be encoded once for all of them)
+    """
+    attributes,values,classes = [],dict(),[]
+    return [compile_tree(tree,attributes,values,classes) for tree in forest if type(tree)!=type(None)]
+
+def encode_points(compiled:CompiledTree,data:pd.DataFrame)->tuple:
+    """
+    * `compiled:CompiledTree`: A compiled tree
+    * `data:pd.DataFrame`: The points we'll classify (or an `EncodedData`)
+    Encodes the points as a matrix with a column for each of the tree's attributes (categorical values become their position
+    in `values[attribute]`, or NaN if the tree has never seen them). Returns (matrix,present), `present` telling which attributes are in the data
+    """
+    if not isinstance(data,EncodedData):
+        return encode_records(compiled,data)
+    matrix = np.full((len(data),len(compiled.attributes)),math.nan)
+    present = np.zeros(len(compiled.attributes),dtype=bool)
+    for feature,attribute in enumerate(compiled.attributes):
+        if not attribute in data.attributes:
+            continue
+        present[feature] = True
+        if attribute in compiled.values:
+            #The data set has its own codes, so we translate them
+            codes = {value_key(value):code for code,value in enumerate(compiled.values[attribute])}
+            translation = np.array([codes.get(value_key(value),math.nan) for value in data.values[attribute]],dtype=float)
+            matrix[:,feature] = translation[data.column(attribute)]
+        else:
+            matrix[:,feature] = data.column(attribute)
+    return (matrix,present)
+
+@timed('predict_batch',lambda tree,data: len(data))
+def predict_batch(tree,data:pd.DataFrame)->np.ndarray:
+    """
+    * `tree`: A tree (or a `CompiledTree`)
+    * `data:pd.DataFrame`: The points we'll classify (or an `EncodedData`)
+    Classifies all points at once. Returns an array with the same labels `classify_point` would give
+    (None where it couldn't classify the point)
+    """
+    compiled = tree if isinstance(tree,CompiledTree) else compile_tree(tree)
+    codes = predict_codes(compiled,*encode_points(compiled,data))
+    labels = np.array(compiled.classes+[None],dtype=object)
+    return labels[codes]
+
+def tree_depth(compiled:CompiledTree)->int:
+    """
+    * `compiled:CompiledTree`: A compiled tree
+    Returns how deep the tree is (0 if it's only a leaf)
+    """
+    level = np.zeros(1,dtype=np.int32)
+    depth = 0
+    while True:
+        #We go down one level at a time, collecting all children of the splits
+        split = level[compiled.feature[level]>=0]
+        if not len(split):
+            return depth
+        numerical = ~np.isnan(compiled.threshold[split])
+        categorical = split[~numerical]
+        branches = [compiled.branches[compiled.left[node]:compiled.left[node]+compiled.right[node]] for node in categorical]
+        level = np.concatenate([compiled.left[split[numerical]],compiled.right[split[numerical]]]+branches)
+        level = level[level>=0]
+        depth += 1
+
+@timed('order_trees',lambda forest,data,label_column: len(data))
+def order_trees(forest:list,data:pd.DataFrame,label_column:str)->list:
+    """
+    * `forest:list`: A forest (or a list of trees compiled by `compile_forest`)
+    * `data:pd.DataFrame`: A validation set (or an `EncodedData`)
+    * `label_column:str`: The column we'll use as our labels
+    Ranks the trees for `forest_predict_batch`'s early exit: the ones with the best scores on the validation set first,
+    and the shallowest ones first among those with the same score. Returns their positions in the (compiled) forest
+    """
+    compiled = forest if all(isinstance(tree,CompiledTree) for tree in forest) else compile_forest(forest)
+    matrix,present = encode_points(compiled[0],data)
+    labels = column_values(data,label_column)
+    classes = np.array(compiled[0].classes+[None],dtype=object)
+    scores = [np.count_nonzero(classes[predict_codes(tree,matrix,present)]==labels) for tree in compiled]
+    return sorted(range(len(compiled)),key=lambda i: (-scores[i],tree_depth(compiled[i]),i))
+
+@timed('forest_predict_batch',lambda forest,data,*args,**kwargs: len(data))
+def forest_predict_batch(forest:list,data:pd.DataFrame,order:list=None,early_exit:bool=False)->np.ndarray:
+    """
+    * `forest:list`: A forest (or a list of trees compiled by `compile_forest`)
+    * `data:pd.DataFrame`: The points we'll classify (or an `EncodedData`)
+    * `order:list`: The positions of the trees in the order they'll be evaluated (see `order_trees`). By default, the forest's own order
+    * `early_exit:bool`: Whether to stop evaluating trees for each point once its leading label can't be overtaken by the remaining trees
+      (the strongest trees should go first for this, see `order_trees`)
+    Classifies all points at once with the forest. Returns an array with the same labels `forest_classify` would give
+    (for any `order`, with or without `early_exit`)
+    """
+    compiled = forest if all(isinstance(tree,CompiledTree) for tree in forest) else compile_forest(forest)
+    #All trees share the same tables, so we encode the points only once
+    matrix,present = encode_points(compiled[0],data)
+    winner = vote_codes(compiled,matrix,present,order,early_exit)
+    labels = np.array(compiled[0].classes+[None],dtype=object)
+    return labels[winner]
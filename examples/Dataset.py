@@ -0,0 +1,184 @@
+import pandas as pd
+import numpy as np
+import math
+from multiprocessing import shared_memory
+from Profiling import timed,first_length
+from Inference import value_key
+
+class EncodedData:
+    """
+    A data set stored as NumPy arrays, so the tree functions don't need to use pandas at every node.
+    * `labels`: The labels, encoded as integers (positions in `classes`)
+    * `classes`: All possible labels, sorted
+    * `columns`: A dict with each attribute's values. Numerical attributes are kept as they are,
+      categorical ones are encoded as integers (positions in `values[attribute]`)
+    * `values`: A dict with all possible values for each categorical attribute, sorted
+    * `rows`: The rows that are part of this (sub)set
+
+    Subsets share the same arrays and only have different `rows`, so they're cheap to make.
+    """
+    def __init__(self,label_column:str,labels:np.ndarray,classes:np.ndarray,columns:dict,values:dict,rows:np.ndarray=None):
+        self.label_column = label_column
+        self.labels = labels
+        self.classes = classes
+        self.columns = columns
+        self.values = values
+        self.rows = np.arange(len(labels),dtype=np.int32) if rows is None else rows
+    def __len__(self)->int:
+        return len(self.rows)
+    @property
+    def attributes(self)->list:
+        return list(self.columns)
+    def is_categorical(self,attribute:str)->bool:
+        return attribute in self.values
+    def column(self,attribute:str)->np.ndarray:
+        """
+        * `attribute:str`: An attribute
+        Returns that attribute's values (or codes, if it's categorical) for the rows in this subset
+        """
+        return self.columns[attribute][self.rows]
+    def label_codes(self)->np.ndarray:
+        """
+        Returns the encoded labels for the rows in this subset
+        """
+        return self.labels[self.rows]
+    def subset(self,rows:np.ndarray)->'EncodedData':
+        """
+        * `rows:np.ndarray`: The rows (of the whole set) we'll keep
+        Returns a subset with those rows, sharing this set's arrays
+        """
+        return EncodedData(self.label_column,self.labels,self.classes,self.columns,self.values,rows)
+    @timed('subset',first_length)
+    def where(self,mask:np.ndarray)->'EncodedData':
+        """
+        * `mask:np.ndarray`: A boolean array with an entry for each row in this subset
+        Returns the subset of the rows marked as True
+        """
+        return self.subset(self.rows[mask])
+    def mode(self):
+        """
+        Returns the most common label (the first one in sorted order if there's a tie, just like `pd.Series.mode`)
+        """
+        return self.classes[np.bincount(self.label_codes()).argmax()]
+    def to_frame(self)->pd.DataFrame:
+        """
+        Decodes this subset back into a DataFrame
+        """
+        frame = pd.DataFrame({attribute:(self.values[attribute][self.column(attribute)] if self.is_categorical(attribute) else self.column(attribute)) for attribute in self.columns})
+        frame[self.label_column] = self.classes[self.label_codes()]
+        return frame
+
+@timed('encode_data',first_length)
+def encode_data(data:pd.DataFrame,label_column:str)->EncodedData:
+    """
+    * `data:pd.DataFrame`: The data set we're encoding
+    * `label_column:str`: The column we'll use as our labels
+    Encodes a data set as NumPy arrays. Just like in `best_split`, columns with the `object` dtype are categorical.
+    """
+    labels,classes = pd.factorize(data[label_column],sort=True)
+    columns = dict()
+    values = dict()
+    for attribute in data.columns:
+        if attribute==label_column:
+            continue
+        if data[attribute].dtype == object:
+            #(Missing values are a value of their own, the last one, just like any other value gets its own subset)
+            codes,uniques = pd.factorize(data[attribute],sort=True,use_na_sentinel=False)
+            columns[attribute],values[attribute] = codes,np.array([value_key(value) for value in uniques],dtype=object)
+        else:
+            columns[attribute] = np.ascontiguousarray(data[attribute].to_numpy())
+    return EncodedData(label_column,labels,classes.to_numpy(),columns,values)
+
+@timed('bin_data',first_length)
+def bin_data(data:EncodedData,bins:int)->tuple:
+    """
+    * `data:EncodedData`: An encoded data set
+    * `bins:int`: The maximum number of bins for each numerical attribute
+    Splits each numerical attribute into (at most) `bins` bins with about the same number of points each (their quantiles).
+    Each bin's upper edge is one of the attribute's values, so it can be used as a threshold. Attributes with fewer distinct
+    values than that get a bin for each value. Returns (binned,edges): each row's bin for every attribute
+    (categorical attributes keep their codes) and each numerical attribute's bin edges
+    """
+    binned = dict()
+    edges = dict()
+    for attribute in data.attributes:
+        #(The bins are indexed by the rows of the whole set, like the columns)
+        column = data.columns[attribute]
+        if data.is_categorical(attribute):
+            binned[attribute] = column
+            continue
+        values = np.sort(data.column(attribute))
+        distinct = np.unique(values)
+        if len(distinct)<=bins:
+            edges[attribute] = distinct
+        else:
+            #The last point of each quantile is its edge (the last one being the maximum)
+            edges[attribute] = np.unique(values[np.ceil(np.arange(1,bins+1)*len(values)/bins).astype(int)-1])
+        #Each point goes to the first bin whose edge it doesn't go over
+        binned[attribute] = np.searchsorted(edges[attribute],column,side='left').astype(np.int32)
+    return (binned,edges)
+
+@timed('class_histograms',first_length)
+def class_histograms(data:EncodedData,binned:dict,edges:dict)->dict:
+    """
+    * `data:EncodedData`: A (sub)set of an encoded data set
+    * `binned:dict`,`edges:dict`: The whole set's bins (see `bin_data`)
+    Counts how many points of each class there are in each bin (or with each value, for categorical attributes) for every attribute.
+    Returns a dict with a (bins/values × classes) matrix for each attribute
+    """
+    labels = data.label_codes()
+    n_classes = len(data.classes)
+    histograms = dict()
+    for attribute,codes in binned.items():
+        size = len(edges[attribute]) if attribute in edges else len(data.values[attribute])
+        histograms[attribute] = np.bincount(codes[data.rows]*n_classes+labels,minlength=size*n_classes).reshape(size,n_classes)
+    return histograms
+
+# The data set shared with this worker process, if any (see `share_data` and `attach_data`)
+_shared = None
+
+def share_data(data:EncodedData)->tuple:
+    """
+    * `data:EncodedData`: An encoded data set
+    Copies a data set's arrays to shared memory blocks only once, so worker processes can read them without receiving a copy per task.
+    Returns (blocks,arguments): the blocks (to be closed and unlinked when the workers are done) and the arguments for `attach_data`
+    """
+    blocks = []
+    specs = dict()
+    for name,array in [('labels',data.labels)]+[(('column',attribute),column) for attribute,column in data.columns.items()]:
+        block = shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+        np.ndarray(array.shape,dtype=array.dtype,buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[name] = (block.name,array.shape,array.dtype)
+    #The label and category tables are small, so they're simply sent along
+    return (blocks,(data.label_column,data.classes,data.values,specs))
+
+def attach_data(label_column:str,classes:np.ndarray,values:dict,specs:dict):
+    """
+    Rebuilds a data set shared by `share_data` on top of its shared memory blocks (run it once on each worker process, as the pool's initializer)
+    """
+    global _shared
+    blocks = {name:shared_memory.SharedMemory(name=spec[0]) for name,spec in specs.items()}
+    arrays = {name:np.ndarray(specs[name][1],dtype=specs[name][2],buffer=block.buf) for name,block in blocks.items()}
+    columns = {name[1]:array for name,array in arrays.items() if name!='labels'}
+    _shared = (EncodedData(label_column,arrays['labels'],classes,columns,values),blocks)
+
+def shared_data()->EncodedData:
+    """
+    Returns the data set attached to this worker process (see `attach_data`)
+    """
+    return _shared[0]
+
+def column_values(data:pd.DataFrame,column:str)->np.ndarray:
+    """
+    * `data:pd.DataFrame`: A data set (or an `EncodedData`)
+    * `column:str`: One of its columns (it can be the label column)
+    Returns that column's (decoded) values as an array
+    """
+    if not isinstance(data,EncodedData):
+        return data[column].to_numpy()
+    if column==data.label_column:
+        return data.classes[data.label_codes()]
+    if data.is_categorical(column):
+        return data.values[column][data.column(column)]
+    return data.column(column)
@@ -4,7 +4,7 @@ import math
 
 # Imports from the main guide
 # Part 1
-from Part1 import set_entropy
+from Part1 import set_entropy,counts_entropy,partition_entropy
 # Part 2
 from Part2 import attribute_entropy
 # Part 3
@@ -12,12 +12,41 @@ from Part3 import num_attribute_entropy,minimum_num_attribute_entropy
 # Part 5
 from Part5 import classify_point
 
+# Batch classification
+from Compiled import predict_batch
+
+# Encoded data sets
+from Dataset import column_values
+
+# Instrumentation
+from Profiling import timed
+
+@timed('tree_score',lambda tree,data,label_column: len(data))
 def tree_score(tree:tuple,data:pd.DataFrame,label_column:str)->float:
-    return sum([classify_point(point,tree)==point[label_column] for i,point in data.iterrows()])/len(data)
+    return np.count_nonzero(predict_batch(tree,data)==column_values(data,label_column))/len(data)
+
+def _subtree_stats(tree:tuple,columns:dict,codes:np.ndarray,rows:np.ndarray,stats:dict)->int:
+    # Sends the rows down the tree once, storing for each node how many of the rows that reach it
+    # it classifies correctly and how many there are of each class. Returns the amount of correct classifications
+    if tree is None:
+        return 0
+    if not tree[2]:
+        correct = np.count_nonzero(columns['label'][rows]==tree[0])
+    else:
+        x = columns[tree[0]][rows]
+        if tree[1] != None:
+            lessereq = x<=tree[1]
+            correct = _subtree_stats(tree[2]['lessereq'],columns,codes,rows[lessereq],stats)+\
+                      _subtree_stats(tree[2]['greater'],columns,codes,rows[~lessereq],stats)
+        else:
+            # (Points with values the tree doesn't know can't be classified correctly)
+            correct = sum([_subtree_stats(tree[2][child],columns,codes,rows[x==child],stats) for child in tree[2]])
+    stats[id(tree)] = (correct,np.bincount(codes[rows],minlength=len(columns['classes'])))
+    return correct
 
-def prune_tree_score(tree:tuple,data:pd.DataFrame,label_column:str,subset:pd.DataFrame=None,root_tree:tuple=None,parent:tuple=None,childname:str=None)->tuple:
+def _prune_tree_score(tree:tuple,columns:dict,codes:np.ndarray,stats:dict,subset:np.ndarray=None)->tuple:
     # If we have no data, something went wrong
-    if len(data)==0 or ((type(subset)!=type(None)) and len(subset)==0):
+    if len(codes)==0 or ((type(subset)!=type(None)) and len(subset)==0):
         return None
     # If we're a leaf, just return ourselves
     if not tree[2]:
@@ -27,38 +56,59 @@ def prune_tree_score(tree:tuple,data:pd.DataFrame,label_column:str,subset:pd.Dat
         # Become a leaf
         return (tree[2][next(iter(tree[2]))][0],None,None)
     # Unless we are in the root, we should try pruning this node off
-    if root_tree:
-        score = tree_score(root_tree,data,label_column)
-        #We define our parent node's child at our position as a leaf with our most frequent class
-        parent[2][childname] = (subset[label_column].mode()[0],None,None)
-        newscore = tree_score(root_tree,data,label_column)
-
-        if newscore>score:
+    if type(subset)!=type(None):
+        # Replacing this node by a leaf with our most frequent class only changes the score on the points that reach it,
+        # so we compare how many of them each option classifies correctly
+        mode = np.bincount(codes[subset]).argmax()
+        correct,counts = stats[id(tree)]
+        if counts[mode]>correct:
             #This branch stays a leaf
-            return (subset[label_column].mode()[0],None,None)
-        else:
-            #We go back to what we were before
-            parent[2][childname] = tree
+            return (columns['classes'][mode],None,None)
     else:
-        root_tree=tree
-        subset = data
+        subset = np.arange(len(codes))
     # We'll now prune each child
-
+    # (Each child's subset is made with our own split only, just like in the original method)
+    rows = np.arange(len(codes))
+    x = columns[tree[0]]
     # If it's a numerical branch
     if tree[1] != None:
         #Prune the "lesser" tree
-        tree[2]['lessereq']=prune_tree_score(tree[2]['lessereq'],data,label_column,data[data[tree[0]]<=tree[1]],root_tree,tree,'lessereq')
-        tree[2]['greater']=prune_tree_score(tree[2]['greater'],data,label_column,data[data[tree[0]]>tree[1]],root_tree,tree,'greater')
+        tree[2]['lessereq']=_prune_tree_score(tree[2]['lessereq'],columns,codes,stats,rows[x<=tree[1]])
+        tree[2]['greater']=_prune_tree_score(tree[2]['greater'],columns,codes,stats,rows[x>tree[1]])
         if not tree[2]['lessereq'] or not tree[2]['greater']:
-                return (subset[label_column].mode()[0],None,None)
+                return (columns['classes'][np.bincount(codes[subset]).argmax()],None,None)
     else:
         for child in tree[2]:
-            nsubset = data[data[tree[0]]==child]
+            nsubset = rows[x==child]
             # If one of the children is empty
             if len(nsubset) == 0:
-                return (subset[label_column].mode()[0],None,None)
-            tree[2][child]=prune_tree_score(tree[2][child],data,label_column,nsubset,root_tree,tree,child)
+                return (columns['classes'][np.bincount(codes[subset]).argmax()],None,None)
+            tree[2][child]=_prune_tree_score(tree[2][child],columns,codes,stats,nsubset)
     return tree
+
+def _tree_attributes(tree:tuple)->set:
+    # Lists all attributes a tree splits by
+    if tree is None or not tree[2]:
+        return set()
+    return {tree[0]}.union(*[_tree_attributes(tree[2][child]) for child in tree[2]])
+
+@timed('prune_tree_score',lambda tree,data,label_column: len(data))
+def prune_tree_score(tree:tuple,data:pd.DataFrame,label_column:str)->tuple:
+    """
+    * `tree:tuple`: A tree
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`)
+    * `label_column:str`: The column we'll use as our labels
+    Prunes a tree by score. Instead of scoring the whole tree twice for each node, it sends the points down the tree only once,
+    counting how many of them each node classifies correctly, and uses those counts for deciding whether to prune each node.
+    """
+    # We take the columns the tree uses out of the data set only once
+    columns = {attribute:column_values(data,attribute) for attribute in _tree_attributes(tree)}
+    columns['label'] = column_values(data,label_column)
+    codes,classes = pd.factorize(columns['label'],sort=True)
+    columns['classes'] = np.asarray(classes)
+    stats = dict()
+    _subtree_stats(tree,columns,codes,np.arange(len(codes)),stats)
+    return _prune_tree_score(tree,columns,codes,stats)
 def prune_tree_entropy(tree:tuple,data:pd.DataFrame,label_column:str,threshold:float=1):
     # If we're a leaf, just return ourselves
     if not tree[2]:
@@ -94,13 +144,67 @@ def prune_tree_entropy(tree:tuple,data:pd.DataFrame,label_column:str,threshold:f
                 tree[2][child]=prune_tree_entropy(tree[2][child],nsubset,label_column,threshold)
     return tree
 
-def prune_tree(tree:tuple,data:pd.DataFrame,label_column:str,method='entropy',threshold:float=1)->tuple:
+def _node_counts(tree:tuple)->np.ndarray:
+    # A node's class counts (see `annotate_tree`)
+    if len(tree)<4:
+        raise ValueError("Pruning without data needs the class counts of every node (see annotate_tree)")
+    return np.array(list(tree[3].values()))
+
+def _mode_leaf(tree:tuple)->tuple:
+    # A leaf with a node's most frequent class (the first one in sorted order if there's a tie, just like `pd.Series.mode`), keeping its counts
+    return (list(tree[3])[_node_counts(tree).argmax()],None,None,tree[3])
+
+def prune_tree_counts(tree:tuple,threshold:float=1)->tuple:
+    """
+    * `tree:tuple`: A tree with class counts in every node (see `annotate_tree`)
+    * `threshold:float`: The minimum information gain a split needs to be kept
+    Prunes a tree by entropy just like `prune_tree_entropy` would with the data set it was annotated with, using only its counts.
+    The tree isn't changed (the pruned one is a new tree sharing its counts), so it can be pruned again with other thresholds.
+    (A categorical node's points with values it has no child for are taken as one more subset, whatever their values)
+    """
+    # If we're a leaf, just return ourselves
+    if tree is None or not tree[2]:
+        return tree
+    # If all children are leaves and the same
+    if all([tree[2][child][2]==None for child in tree[2]]) and len({tree[2][child][0] for child in tree[2]})==1:
+        return (tree[2][next(iter(tree[2]))][0],None,None,tree[3])
+    counts = _node_counts(tree)
+    # If no points reach us, there's nothing to decide with
+    if not counts.any():
+        return tree
+    # Check our information gain, from our children's counts
+    if tree[1] != None:
+        subsets = [_node_counts(tree[2]['lessereq']),_node_counts(tree[2]['greater'])]
+    else:
+        subsets = [_node_counts(child) for child in tree[2].values()]
+        subsets.append(counts-np.sum(subsets,axis=0))
+    entropy = counts_entropy(counts[None,:])[0].item()
+    attentropy = partition_entropy(np.stack(subsets)[None,:,:])[0].item()
+    #If it's smaller than the threshold, become a leaf
+    if entropy-attentropy<threshold:
+        return _mode_leaf(tree)
+    #Prune our children
+    #If one of a categorical attribute's children is empty
+    if tree[1] == None and any(not _node_counts(child).any() for child in tree[2].values()):
+        return _mode_leaf(tree)
+    children = {child:prune_tree_counts(tree[2][child],threshold) for child in tree[2]}
+    if tree[1] != None and (not children['lessereq'] or not children['greater']):
+        return _mode_leaf(tree)
+    return (tree[0],tree[1],children,tree[3])
+
+@timed('prune_tree')
+def prune_tree(tree:tuple,data:pd.DataFrame=None,label_column:str=None,method='entropy',threshold:float=1)->tuple:
     """
     * `tree:tuple`: A tree
-    * `data:pd.DataFrame`: The data set we're using as our reference
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+      If it's not given, the tree is pruned by entropy with the class counts in its nodes (see `prune_tree_counts`)
     * `label_column:str`: The column we'll use as our labels
     Prunes a tree using the selected method
     """
+    if data is None:
+        if method != 'entropy':
+            raise ValueError("Only entropy pruning can be done without data")
+        return prune_tree_counts(tree,threshold)
     if method == 'score':
         tree = prune_tree_score(tree,data,label_column)
         return tree
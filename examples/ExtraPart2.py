@@ -1,55 +1,210 @@
 import pandas as pd
 import numpy as np
 import math
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 
 # Imports from the main guide
 # Part 5
 from Part5 import generate_tree,classify_point
 
 # Imports from the extra guide
-from ExtraPart1 import prune_tree,tree_score
+from ExtraPart1 import prune_tree
 
+# Batch classification
+from Compiled import forest_predict_batch,compile_tree,encode_points,predict_codes
+
+# Encoded data sets
+from Dataset import EncodedData,encode_data,column_values,share_data,attach_data,shared_data
+
+# Instrumentation
+from Profiling import timed,profiling,phase
+
+# Split cache
+from Caching import SplitCache,caching
+
+# Each worker process's split cache, if the forest uses one
+_worker_cache = None
+
+@timed('forest_score',lambda forest,data,label_column: len(data))
 def forest_score(forest:list,data:pd.DataFrame,label_column:str)->float:
-    return sum([forest_classify(forest,point)==point[label_column] for i,point in data.iterrows()])/len(data)
+    return np.count_nonzero(forest_predict_batch(forest,data)==column_values(data,label_column))/len(data)
+
+def _bag(data:EncodedData,generator:np.random.Generator,bagsize:int)->EncodedData:
+    #A bootstrap sample is just a list of rows of the shared data set (sorted, so reading the columns goes through memory in order;
+    #the order of the points doesn't change the tree)
+    return data.subset(data.rows[np.sort(generator.integers(len(data),size=bagsize))])
 
-def generate_forest(data:pd.DataFrame,label_column:str,forest_size:int,threshold_deviation:float,bagsize:int=0,maxiterations:int=20)->tuple:
+class _OutOfBag:
+    """
+    The forest's out-of-bag votes: each tree votes only for the rows it wasn't trained or pruned with, and every row's label is
+    the one most of its trees voted for. Adding or removing a tree only updates its own rows, so the score is never recalculated from scratch.
+    * `votes`: How many trees voted for each label (by its position in `classes`, with an extra last column for trees that couldn't classify the row)
+    * `winners`: Each row's label (-1 if no tree has voted for it yet)
+    * `correct`,`voted`: How many rows are classified correctly, and how many have votes
+    """
+    def __init__(self,data:EncodedData):
+        self.labels = data.labels
+        self.votes = np.zeros((len(data.labels),len(data.classes)+1),dtype=np.int32)
+        self.winners = np.full(len(data.labels),-1)
+        self.correct = 0
+        self.voted = 0
+    def vote(self,rows:np.ndarray,codes:np.ndarray,weight:int=1):
+        """
+        * `rows:np.ndarray`: The rows a tree votes for
+        * `codes:np.ndarray`: Its labels for them (see `_grow_tree`)
+        * `weight:int`: 1 to add the tree's votes, -1 to take them back
+        """
+        labels = self.labels[rows]
+        before = self.winners[rows]
+        self.votes[rows,codes] += weight
+        #Rows without votes have no label (and a tie goes to the first label; winning with the last column never matches a label)
+        after = np.where(self.votes[rows].any(axis=1),np.argmax(self.votes[rows],axis=1),-1)
+        self.winners[rows] = after
+        self.correct += np.count_nonzero(after==labels)-np.count_nonzero(before==labels)
+        self.voted += np.count_nonzero(after>=0)-np.count_nonzero(before>=0)
+    def score(self)->float:
+        """
+        Returns the fraction of the rows with votes that are classified correctly
+        """
+        return self.correct/self.voted if self.voted else 0
+
+@timed('grow tree')
+def _grow_tree(data:EncodedData,seed:int,iteration:int,slot:int,bagsize:int,bag_tries:int=1)->tuple:
+    #Each tree gets its own random generators, so the forest doesn't depend on which process makes which tree
+    #The pruning bag only depends on the slot, so it's the same for every tree generated there
+    #A training bag can be tried more than once (its tree's splits are in the split cache by then), and its later tries get new pruning bags,
+    #since the same tree would come out otherwise
+    tries = iteration%bag_tries
+    pruning = _bag(data,np.random.default_rng([seed,slot] if not tries else [seed,slot,iteration,tries]),bagsize)
+    train = _bag(data,np.random.default_rng([seed,slot,iteration-tries]),bagsize)
+    tree = prune_tree(generate_tree(train,data.label_column,2,0.05),pruning,data.label_column,'score')
+    #The tree is scored (and votes, see `_OutOfBag`) with the rows left out of both of its bags, which it has never seen
+    #(it was pruned to do well on the pruning bag, so those rows would make it look better than it is)
+    scoring = np.setdiff1d(data.rows,np.union1d(train.rows,pruning.rows))
+    with phase('out-of-bag score',len(scoring)):
+        #We predict the scoring rows' labels as positions in `data.classes` (-1 for no label)
+        compiled = compile_tree(tree)
+        codes = predict_codes(compiled,*encode_points(compiled,data.subset(scoring)))
+        positions = {label:i for i,label in enumerate(data.classes)}
+        codes = np.array([positions.get(label,-1) for label in compiled.classes]+[-1],dtype=np.int32)[codes]
+        score = np.count_nonzero(codes==data.labels[scoring])/len(scoring) if len(scoring) else 0
+    return (tree,score,scoring,codes)
+
+def _grow_shared_tree(task:tuple,profile:bool=False,cache_bytes:int=None)->tuple:
+    #Runs on the worker processes, with its own profile and split cache if we're using them
+    #(the profile's report and the cache's new hits, misses and evictions are sent back with the tree, or None)
+    global _worker_cache
+    with contextlib.ExitStack() as stack:
+        worker = stack.enter_context(profiling()) if profile else None
+        if cache_bytes is not None:
+            if _worker_cache is None:
+                _worker_cache = SplitCache(cache_bytes)
+            before = (_worker_cache.hits,_worker_cache.misses,_worker_cache.evictions)
+            stack.enter_context(caching(_worker_cache))
+        result = _grow_tree(shared_data(),*task)
+    counts = None
+    if cache_bytes is not None:
+        counts = (_worker_cache.hits-before[0],_worker_cache.misses-before[1],_worker_cache.evictions-before[2])
+    return result+(worker.report() if profile else None,counts)
+
+def generate_forest(data:pd.DataFrame,label_column:str,forest_size:int,threshold_deviation:float,bagsize:int=0,maxiterations:int=20,n_jobs:int=1,seed:int=None,profile:bool=False,cache:SplitCache=None,bag_tries:int=1)->tuple:
     """
     * `data:pd.DataFrame`: The data set we're using as our reference
     * `label_column:str`: The column we'll use as our labels
     * `forest_size:int`: The amount of weak classifiers to be generated
     * `threshold_variance:float`: The maximum deviation from the maximum score we'll tolerate within our ensemble
+    * `bagsize:int`: How many points each tree is trained (and pruned) with
+    * `maxiterations:int`: How many times we'll try to replace the trees that deviate from the best one
+    * `n_jobs:int`: How many processes will generate trees at the same time
+    * `seed:int`: The seed for all random samples. If it's not specified, it's taken from `np.random`.
+      Each tree's samples are generated from it, its slot and the iteration, so the same seed gives the same forest for any `n_jobs`
+    * `profile:bool`: Whether to record where the time goes (see Profiling.py). If so, the report is returned too, as (forest,average,report)
+    * `cache:SplitCache`: A split cache for growing the trees (see Caching.py). With many processes, each one has its own cache
+      (of the same size), and their statistics are added to this one
+    * `bag_tries:int`: How many iterations in a row a slot keeps its training bag (with a new pruning bag each time) before drawing a new one.
+      With more than 1, a retried tree's splits come from the cache, but the forest tries different trees. The cache alone never changes the forest
     Generates a forest classifier for the given training set.
+    The data set is encoded only once and the bags are lists of its rows, so no tree gets a copy of the data.
+    Trees are scored with their out-of-bag rows (the ones they weren't trained or pruned with), and the forest with the votes of each row's
+    out-of-bag trees. `average` has (mean tree score,maximum,minimum,forest out-of-bag score) for each iteration, after removing the worst trees.
     """
+    if profile:
+        with profiling() as recorded:
+            forest,average = _generate_forest(data,label_column,forest_size,threshold_deviation,bagsize,maxiterations,n_jobs,seed,cache,bag_tries,recorded)
+        return (forest,average,recorded.report())
+    return _generate_forest(data,label_column,forest_size,threshold_deviation,bagsize,maxiterations,n_jobs,seed,cache,bag_tries)
+
+@timed('generate_forest')
+def _generate_forest(data:pd.DataFrame,label_column:str,forest_size:int,threshold_deviation:float,bagsize:int,maxiterations:int,n_jobs:int,seed:int,cache:SplitCache=None,bag_tries:int=1,recorded=None)->tuple:
+    #Generates the forest (see `generate_forest`), merging the workers' profiles into `recorded` if we're profiling
     #If there's no specified bagsize, we'll use 25% of the set size
-    bagsize = math.ceil(len(data)/4)
-    #Test subsets
-    test = [data.loc[data.index[np.random.choice(len(data),bagsize)]] for i in range(forest_size)]
+    if not bagsize:
+        bagsize = math.ceil(len(data)/4)
+    if seed is None:
+        seed = np.random.randint(2**31)
+    #We encode the data set once for all trees
+    encoded = encode_data(data,label_column)
     #First we generate an empty forest
     forest = np.array([None for i in range(forest_size)])
-    #And iterate until it's full
-    #This variable is for keeping average tree scores for each iteration
-    average = []
-    i=0
-    while None in forest:
-        #First we generate our subsets
-        train = [data.loc[data.index[np.random.choice(len(data),bagsize)]] for f in forest]
-        print(f"Forest generation: creating {len(forest[forest==None])} new trees")
-        #Populate the empty slots with new trees
-        tforest = np.empty((forest_size,),dtype=object)
-        tforest[:] = [tree if type(tree)!=type(None) else prune_tree(generate_tree(train[i],label_column,2,0.05),test[i],label_column,'score') for i,tree in enumerate(forest)]
-        forest=tforest
-        #Calculate their estimated scores
-        scores = np.array([tree_score(tree,test[i],label_column) for i,tree in enumerate(forest)])
-        #Find the maximum and calculate the deviations
-        m = np.max(scores)
-        dev = np.abs(scores - m)
-        #Eliminate the ones with deviation above the threshold
-        print("Eliminating trees")
-        forest[dev>threshold_deviation] = None
-        average.append((np.mean(scores),m,np.min(scores),forest_score(forest,data,label_column)))
-        i+=1
-        if i>maxiterations:
-            break
+    #And their estimated scores (on each one's out-of-bag rows)
+    scores = np.zeros(forest_size)
+    #The forest's out-of-bag votes, and the rows and labels each slot's tree voted with (so they can be taken back)
+    out_of_bag = _OutOfBag(encoded)
+    ballots = [None for i in range(forest_size)]
+    #If we're using many processes, the data set is sent to them only once
+    pool = None
+    if n_jobs>1:
+        blocks,shared = share_data(encoded)
+        pool = ProcessPoolExecutor(n_jobs,initializer=attach_data,initargs=shared)
+    try:
+        #And iterate until it's full
+        #This variable is for keeping average tree scores for each iteration
+        average = []
+        i=0
+        while None in forest:
+            empty = [slot for slot,tree in enumerate(forest) if type(tree)==type(None)]
+            print(f"Forest generation: creating {len(empty)} new trees")
+            #Populate the empty slots with new trees
+            tasks = [(seed,i,slot,bagsize,bag_tries) for slot in empty]
+            #(With many processes, 'grow tree' adds up all of their time, and this is how long the round took)
+            with phase('grow trees',len(tasks)):
+                if pool:
+                    trees = list(pool.map(_grow_shared_tree,tasks,[recorded is not None]*len(tasks),[None if cache is None else cache.max_bytes]*len(tasks)))
+                else:
+                    with caching(cache) if cache is not None else contextlib.nullcontext():
+                        trees = [_grow_tree(encoded,*task)+(None,None) for task in tasks]
+            for slot,(tree,score,rows,codes,report,counts) in zip(empty,trees):
+                forest[slot] = tree
+                scores[slot] = score
+                ballots[slot] = (rows,codes)
+                with phase('out-of-bag votes',len(rows)):
+                    out_of_bag.vote(rows,codes)
+                if report:
+                    recorded.merge(report)
+                if counts:
+                    cache.hits += counts[0]
+                    cache.misses += counts[1]
+                    cache.evictions += counts[2]
+            #Find the maximum and calculate the deviations
+            m = np.max(scores)
+            dev = np.abs(scores - m)
+            #Eliminate the ones with deviation above the threshold
+            print("Eliminating trees")
+            for slot in np.flatnonzero(dev>threshold_deviation):
+                forest[slot] = None
+                with phase('out-of-bag votes',len(ballots[slot][0])):
+                    out_of_bag.vote(*ballots[slot],-1)
+            average.append((np.mean(scores),m,np.min(scores),out_of_bag.score()))
+            i+=1
+            if i>maxiterations:
+                break
+    finally:
+        if pool:
+            pool.shutdown()
+            for block in blocks:
+                block.close()
+                block.unlink()
     return (forest,average)
 def forest_classify(forest:list,point:pd.Series)->str:
     """
@@ -57,7 +212,17 @@ def forest_classify(forest:list,point:pd.Series)->str:
     * `point:pd.Series`: A data point
     Classifies a point using a forest
     """
-    #Process all tree predictions
-    predictions = [classify_point(point,tree) for tree in forest if type(tree)!=type(None)]
+    #Count the votes of all trees (in the order they voted, so in case of a tie the first one wins)
+    votes = dict()
+    remaining = sum(type(tree)!=type(None) for tree in forest)
+    for tree in forest:
+        if type(tree)!=type(None):
+            prediction = classify_point(point,tree)
+            votes[prediction] = votes.get(prediction,0)+1
+            remaining -= 1
+            #We stop once the leading label has more votes than the runner-up could reach with the remaining trees
+            leading,runner_up = (sorted(votes.values(),reverse=True)+[0])[:2]
+            if leading>runner_up+remaining:
+                break
     #Return the most frequent
-    return max(predictions, key = predictions.count)
\ No newline at end of file
+    return max(votes, key = votes.get)
\ No newline at end of file
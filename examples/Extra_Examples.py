@@ -95,7 +95,7 @@ forest,averages = generate_forest(atrain,'language',n_trees,.05)
 print(averages)
 print(f"Forest score for {n_trees} trees, accent dataset: {forest_score(forest,atest,'language')}")
 if genfigures:
-    d=pd.DataFrame(averages,columns=['Mean tree score','Maximum tree score','Minimum tree score','Ensemble score'])
+    d=pd.DataFrame(averages,columns=['Mean tree score','Maximum tree score','Minimum tree score','Ensemble out-of-bag score'])
     d['Iteration'] = list(range(len(d)))
     sns.lineplot(data=pd.melt(d,'Iteration',var_name="Variable",value_name="Score"),x="Iteration",y="Score",hue="Variable")
     plt.show()
@@ -118,7 +118,7 @@ forest,averages = generate_forest(train,'class',n_trees,.05)
 print(averages)
 print(f"Forest score for {n_trees} trees, iris dataset: {forest_score(forest,test,'class')}")
 if genfigures:
-    d=pd.DataFrame(averages,columns=['Mean tree score','Maximum tree score','Minimum tree score','Ensemble score'])
+    d=pd.DataFrame(averages,columns=['Mean tree score','Maximum tree score','Minimum tree score','Ensemble out-of-bag score'])
     d['Iteration'] = list(range(len(d)))
     sns.lineplot(data=pd.melt(d,'Iteration',var_name="Variable",value_name="Score"),x="Iteration",y="Score",hue="Variable")
     plt.show()
\ No newline at end of file
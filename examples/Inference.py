@@ -0,0 +1,194 @@
+"""
+Inference only: loading trees and forests saved by `save_model` (see Storage.py) and classifying points with them, using nothing but NumPy.
+
+This module doesn't import pandas (or any of the training code), so short-lived processes that only classify start quickly:
+`predict(load_model('model.c45m'),[{'X1':0.5,...},...])`. Points can also come as a `pd.DataFrame` (pandas is only used if they do).
+Compiled.py and Storage.py build on it, and the compiled trees are the same ones.
+"""
+import numpy as np
+import math
+import json
+import struct
+
+MAGIC = b'C45M'
+VERSION = 1
+# The arrays in a `CompiledTree` and how they're saved
+FIELDS = (('feature','<i4'),('threshold','<f8'),('left','<i4'),('right','<i4'),('leaf','<i4'),('branches','<i4'))
+ALIGNMENT = 64
+
+class CompiledTree:
+    """
+    A tree flattened into parallel NumPy arrays, with one entry per node (the root is node 0).
+    * `feature`: The attribute each node splits by (its position in `attributes`), or -1 for leaves
+    * `threshold`: The threshold for numerical splits (NaN otherwise)
+    * `left`,`right`: For numerical splits, the "lessereq" and "greater" children.
+      For categorical splits, `left` is where the node's children start in `branches` and `right` is how many there are
+    * `leaf`: For leaves, their label (its position in `classes`), or -1 for splits
+    * `branches`: The children of all categorical splits, indexed by the value's position in `values[attribute]`
+      (-1 if there's no child for that value)
+    * `attributes`,`values`,`classes`: The attribute names, the possible values for each categorical attribute and the labels.
+      They can be shared between the trees of a forest (see `compile_forest`)
+    """
+    def __init__(self,feature:np.ndarray,threshold:np.ndarray,left:np.ndarray,right:np.ndarray,leaf:np.ndarray,branches:np.ndarray,attributes:list,values:dict,classes:list):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf = leaf
+        self.branches = branches
+        self.attributes = attributes
+        self.values = values
+        self.classes = classes
+    def __len__(self)->int:
+        return len(self.feature)
+
+def load_model(path:str,mmap:bool=True):
+    """
+    * `path:str`: A file saved by `save_model`
+    * `mmap:bool`: Whether to memory-map the arrays (so loading is almost instant and only the parts that are used are ever read)
+      instead of reading them
+    Loads a tree (as a `CompiledTree`) or a forest (as a list of them), ready for `predict` (or `predict_batch` and `forest_predict_batch`)
+    """
+    with open(path,'rb') as file:
+        if file.read(len(MAGIC))!=MAGIC:
+            raise ValueError(f"{path} isn't a model file")
+        version,length = struct.unpack('<IQ',file.read(12))
+        if version>VERSION:
+            raise ValueError(f"{path} was saved with a newer format (version {version}, we can read up to {VERSION})")
+        header = json.loads(file.read(length))
+    start = -(-(len(MAGIC)+12+length)//ALIGNMENT)*ALIGNMENT
+    raw = np.memmap(path,dtype=np.uint8,mode='r') if mmap else np.fromfile(path,dtype=np.uint8)
+    arrays = {name:raw[start+spec['offset']:start+spec['offset']+spec['length']*np.dtype(spec['dtype']).itemsize].view(spec['dtype']) for name,spec in header['arrays'].items()}
+    #Each tree's arrays are slices of the whole ones, and all trees share the same tables
+    attributes,values,classes = header['attributes'],header['values'],header['classes']
+    trees = []
+    node = branch = 0
+    for nodes,branches in zip(header['nodes'],header['branches']):
+        fields = [arrays[name][node:node+nodes] for name,dtype in FIELDS[:-1]]+[arrays['branches'][branch:branch+branches]]
+        trees.append(CompiledTree(*fields,attributes,values,classes))
+        node += nodes
+        branch += branches
+    return trees[0] if header['kind']=='tree' else trees
+
+def value_key(value):
+    """
+    * `value`: A categorical value
+    Returns the key to look the value up with. Missing values (None or NaN) are a value of their own, like in `encode_data`,
+    but NaN isn't even equal to itself, so they all get the same NaN as their key
+    """
+    return math.nan if value is None or value!=value else value
+
+def encode_records(compiled:CompiledTree,points)->tuple:
+    """
+    * `compiled:CompiledTree`: A compiled tree
+    * `points`: The points we'll classify, as a list of {attribute:value} dicts (or a `pd.DataFrame`)
+    Encodes the points like `encode_points` does: as a matrix with a column for each of the tree's attributes. Returns (matrix,present)
+    """
+    matrix = np.full((len(points),len(compiled.attributes)),math.nan)
+    present = np.zeros(len(compiled.attributes),dtype=bool)
+    if isinstance(points,(list,tuple)):
+        #An attribute is there if any point has it (the others get NaN, like `pd.DataFrame.from_records` would do)
+        available = set().union(*points)
+        column = lambda attribute: [point.get(attribute,math.nan) for point in points]
+    else:
+        available = points.columns
+        column = lambda attribute: points[attribute]
+    for feature,attribute in enumerate(compiled.attributes):
+        if not attribute in available:
+            continue
+        present[feature] = True
+        values = column(attribute)
+        if attribute in compiled.values:
+            codes = {value_key(value):code for code,value in enumerate(compiled.values[attribute])}
+            matrix[:,feature] = values.map(codes).to_numpy(dtype=float) if hasattr(values,'map') else [codes.get(value_key(value),math.nan) for value in values]
+        else:
+            matrix[:,feature] = np.asarray(values,dtype=float)
+    return (matrix,present)
+
+def route_points(compiled:CompiledTree,matrix:np.ndarray,present:np.ndarray)->np.ndarray:
+    """
+    * `compiled:CompiledTree`: A compiled tree
+    * `matrix:np.ndarray`,`present:np.ndarray`: The encoded points (see `encode_points`)
+    Sends all points down the tree at once, one level at a time. Returns each point's leaf (or -1 if it couldn't reach one)
+    """
+    node = np.zeros(len(matrix),dtype=np.int32)
+    active = np.arange(len(matrix))
+    while len(active):
+        current = node[active]
+        feature = compiled.feature[current]
+        #Points that reached a leaf are done
+        split = feature>=0
+        active,current,feature = active[split],current[split],feature[split]
+        x = matrix[active,feature]
+        #Numerical splits
+        child = np.where(x<=compiled.threshold[current],compiled.left[current],compiled.right[current])
+        #Categorical splits
+        categorical = np.isnan(compiled.threshold[current])
+        if categorical.any():
+            code = np.where(np.isnan(x),-1,x).astype(np.int64)
+            known = categorical&(code>=0)&(code<compiled.right[current])
+            child[categorical] = -1
+            child[known] = compiled.branches[compiled.left[current[known]]+code[known]]
+        #If the attribute doesn't exist in the data, something's wrong
+        child[~present[feature]] = -1
+        node[active] = child
+        active = active[child>=0]
+    return node
+
+def predict_codes(compiled:CompiledTree,matrix:np.ndarray,present:np.ndarray)->np.ndarray:
+    """
+    * `compiled:CompiledTree`: A compiled tree
+    * `matrix:np.ndarray`,`present:np.ndarray`: The encoded points (see `encode_points`)
+    Classifies the encoded points. Returns each one's label as its position in `classes` (or -1 for no label)
+    """
+    node = route_points(compiled,matrix,present)
+    return np.where(node>=0,compiled.leaf[node],-1)
+
+def vote_codes(forest:list,matrix:np.ndarray,present:np.ndarray,order:list=None,early_exit:bool=False)->np.ndarray:
+    """
+    * `forest:list`: A list of trees compiled by `compile_forest` (or loaded by `load_model`)
+    * `matrix:np.ndarray`,`present:np.ndarray`: The encoded points (see `encode_points`)
+    * `order:list`,`early_exit:bool`: See `forest_predict_batch`
+    Classifies the encoded points with the forest's votes. Returns each one's label as its position in `classes`+[None]
+    """
+    order = range(len(forest)) if order is None else order
+    classes = forest[0].classes
+    #We count the votes (trees that couldn't classify the point vote for None, which gets the last column if no leaf has it)
+    none = classes.index(None) if None in classes else len(classes)
+    votes = np.zeros((len(matrix),len(classes)+1),dtype=np.int64)
+    #And remember the first tree that voted for each label, since `forest_classify` keeps the first one in case of a tie
+    #(by its position in the forest, so the order we evaluate them in doesn't matter)
+    first = np.full(votes.shape,len(forest))
+    #The points that are still undecided (and their encoded attributes, in `matrix`)
+    rows = np.arange(len(matrix))
+    for step,i in enumerate(order):
+        codes = predict_codes(forest[i],matrix,present)
+        codes[codes<0] = none
+        votes[rows,codes] += 1
+        first[rows,codes] = np.minimum(first[rows,codes],i)
+        #A point is decided once its leading label has more votes than the runner-up could reach with all the remaining trees
+        #(which can't happen before half of them have voted)
+        if early_exit and 2*(step+1)>len(order):
+            top = np.partition(votes[rows],-2,axis=1)
+            undecided = top[:,-1]<=top[:,-2]+len(order)-step-1
+            if not undecided.all():
+                rows,matrix = rows[undecided],matrix[undecided]
+                if not len(rows):
+                    break
+    return np.argmax(votes*(len(forest)+1)-first,axis=1)
+
+def predict(model,points,order:list=None,early_exit:bool=True)->np.ndarray:
+    """
+    * `model`: A `CompiledTree` or a list of them (as `load_model` returns them)
+    * `points`: The points we'll classify, as a list of {attribute:value} dicts (or a `pd.DataFrame`)
+    * `order:list`,`early_exit:bool`: For forests, see `forest_predict_batch`
+    Classifies all points at once. Returns an array with the same labels `predict_batch` (or `forest_predict_batch`) would give
+    """
+    forest = [model] if isinstance(model,CompiledTree) else model
+    matrix,present = encode_records(forest[0],points)
+    if isinstance(model,CompiledTree):
+        codes = predict_codes(model,matrix,present)
+    else:
+        codes = vote_codes(forest,matrix,present,order,early_exit)
+    labels = np.array(forest[0].classes+[None],dtype=object)
+    return labels[codes]
@@ -0,0 +1,114 @@
+"""
+A load generator for the prediction service (see Service.py). Run with `python Load_Generator.py` from this folder.
+
+It grows a forest on the accent dataset (or loads one saved by `save_model`, with --model) and sends points to the service
+at a given rate, with random (exponential) gaps between them, not waiting for the answers. Then it reports the latencies and throughput
+for a few batch settings, next to classifying each point on its own with `forest_classify`.
+With --port, it sends the points over TCP to a service started with `python Service.py model.c45m --port PORT` instead.
+"""
+import pandas as pd
+import numpy as np
+import asyncio
+import json
+import time
+import contextlib
+import io
+import argparse
+from ExtraPart2 import generate_forest,forest_classify
+from Storage import load_model
+from Compiled import CompiledTree
+from Service import ForestService
+
+async def drive(service:ForestService,points:list,rate:float,seed:int=0)->list:
+    """
+    * `service:ForestService`: The service (it shouldn't be running yet)
+    * `points:list`: The points we'll send, as dicts
+    * `rate:float`: How many points we'll send per second, on average
+    * `seed:int`: The seed for the gaps between points
+    Sends the points to the service in this process. Returns their labels
+    """
+    running = asyncio.ensure_future(service.run())
+    gaps = np.random.default_rng(seed).exponential(1/rate,len(points))
+    tasks = []
+    due = time.perf_counter()
+    for point,gap in zip(points,gaps):
+        #We keep to the schedule even if we fall behind (the sleeps aren't that precise), so the service gets the same load
+        due += gap
+        if due>time.perf_counter():
+            await asyncio.sleep(due-time.perf_counter())
+        tasks.append(asyncio.ensure_future(service.classify(point)))
+    labels = await asyncio.gather(*tasks)
+    running.cancel()
+    return labels
+
+async def drive_tcp(port:int,points:list,rate:float,seed:int=0,host:str='127.0.0.1')->dict:
+    """
+    * `port:int`,`host:str`: Where the service is
+    * `points:list`: The points we'll send, as dicts
+    * `rate:float`: How many points we'll send per second, on average
+    * `seed:int`: The seed for the gaps between points
+    Sends the points to a service over TCP. Returns the statistics measured here (see `ForestService.report`)
+    """
+    reader,writer = await asyncio.open_connection(host,port)
+    gaps = np.random.default_rng(seed).exponential(1/rate,len(points))
+    sent = []
+    async def send():
+        due = time.perf_counter()
+        for point,gap in zip(points,gaps):
+            due += gap
+            if due>time.perf_counter():
+                await asyncio.sleep(due-time.perf_counter())
+            sent.append(time.perf_counter())
+            writer.write((json.dumps(point)+'\n').encode())
+        await writer.drain()
+        writer.write_eof()
+    sending = asyncio.ensure_future(send())
+    #The answers come in the same order as the points
+    latencies = []
+    for i in range(len(points)):
+        await reader.readline()
+        latencies.append(time.perf_counter()-sent[i])
+    await sending
+    writer.close()
+    latencies = np.array(latencies)*1000
+    return {'points':len(points),'p50 ms':float(np.percentile(latencies,50)),'p99 ms':float(np.percentile(latencies,99)),
+            'points/s':len(points)/(sent[-1]+latencies[-1]/1000-sent[0])}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the forest prediction service")
+    parser.add_argument('--model',help="A forest saved by save_model (if not given, one is grown on the accent dataset)")
+    parser.add_argument('--trees',type=int,default=16)
+    parser.add_argument('--points',type=int,default=20000)
+    parser.add_argument('--rate',type=float,default=5000)
+    parser.add_argument('--port',type=int)
+    arguments = parser.parse_args()
+    accents = pd.read_csv('accent-recognition-mfcc--1/accent-mfcc-data-1.csv')
+    if arguments.model:
+        forest = load_model(arguments.model)
+        forest = [forest] if isinstance(forest,CompiledTree) else forest
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            forest = generate_forest(accents,'language',arguments.trees,0.05,maxiterations=0,seed=0)[0]
+    rng = np.random.default_rng(1)
+    points = accents.drop(columns='language').iloc[rng.integers(len(accents),size=arguments.points)].to_dict('records')
+    print(f"{arguments.points} points at {arguments.rate:.0f} points/s")
+    print(f"{'max batch':>10} {'max delay':>10} {'mean batch':>11} {'p50':>9} {'p99':>9} {'points/s':>9}")
+    if arguments.port:
+        report = asyncio.run(drive_tcp(arguments.port,points,arguments.rate))
+        print(f"{'(server)':>10} {'':>10} {'':>11} {report['p50 ms']:>7.2f}ms {report['p99 ms']:>7.2f}ms {report['points/s']:>9.0f}")
+    else:
+        #Classifying each point on its own, one after the other (on a few of them, since it's slow)
+        if not arguments.model:
+            single = points[:200]
+            start = time.perf_counter()
+            times = []
+            for point in single:
+                forest_classify(forest,pd.Series(point))
+                times.append((time.perf_counter()-start)*1000)
+                start = time.perf_counter()
+            print(f"{'one by one':>10} {'':>10} {1:>11.1f} {np.percentile(times,50):>7.2f}ms {np.percentile(times,99):>7.2f}ms {1000/np.mean(times):>9.0f}")
+        for max_batch,max_delay in [(1,0),(32,0.001),(256,0.002),(1024,0.005)]:
+            service = ForestService(forest,max_batch,max_delay)
+            asyncio.run(drive(service,points,arguments.rate))
+            report = service.report()
+            print(f"{max_batch:>10} {max_delay*1000:>8.1f}ms {report['mean batch']:>11.1f} {report['p50 ms']:>7.2f}ms {report['p99 ms']:>7.2f}ms {report['points/s']:>9.0f}")
@@ -0,0 +1,270 @@
+"""
+Trees and forests that keep learning from labelled rows as they arrive, without being generated again from the whole history.
+
+An `OnlineTree` starts from an existing tree (or a single leaf) and the rows it was trained with. It keeps, for every leaf,
+how many points of each class fell in each bin of every numerical attribute (the bins are the quantiles of those first rows,
+see `bin_data`) and with each value of every categorical one. New rows are sent down the tree and only update the leaves they reach.
+A leaf is split once the best split's gain is above `info_thresh` and, by the Hoeffding bound, it's very unlikely that another
+attribute would be better with more points (as in Domingos and Hulten's VFDT). Its children start with the split's class counts
+and collect their own histograms from then on. The internal nodes are never changed.
+
+An `OnlineForest` updates each of its trees with every row counted a random number of times (from a Poisson distribution with mean 1),
+which is how a bootstrap sample looks when it's drawn one row at a time (Oza and Russell's online bagging).
+"""
+import pandas as pd
+import numpy as np
+import math
+from Part1 import counts_entropy
+from Part2 import histogram_attribute_entropy
+from Part3 import histogram_num_attribute_entropy
+from Dataset import encode_data,bin_data
+from Profiling import timed
+from Inference import value_key
+
+class OnlineTree:
+    """
+    A tree that can be updated with new labelled rows (see `update`). The current tree is in `tree`.
+    * `mindepth`,`info_thresh`: As in `generate_tree` (above `mindepth`, a leaf is only split if its gain is at least `info_thresh`)
+    * `delta`: The probability of splitting by the wrong attribute we tolerate (the smaller, the more points a leaf needs before splitting)
+    * `tie`: When the Hoeffding bound gets below this, the two best attributes are taken as equally good and the best one is used
+    * `grace`: How many new points a leaf needs to get before we check whether it should be split again
+    * `classes`,`values`,`edges`: The known labels, the known values of each categorical attribute and each numerical attribute's bin edges
+      (with an extra bin for values above the last edge). Labels and values that weren't known before are added when they show up
+    """
+    def __init__(self,tree:tuple,data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,bins:int=64,delta:float=1e-7,tie:float=0.05,grace:int=200,weights:np.ndarray=None):
+        """
+        * `tree:tuple`: The tree we start from (or None, to start from a single leaf)
+        * `data:pd.DataFrame`: The rows it was trained with (their quantiles are the numerical attributes' bins)
+        * `label_column:str`: The column we'll use as our labels
+        * `bins:int`: The maximum number of bins for each numerical attribute
+        * `weights:np.ndarray`: How many times each row counts (integers; by default, once)
+        """
+        self.label_column = label_column
+        self.mindepth = mindepth
+        self.info_thresh = info_thresh
+        self.delta = delta
+        self.tie = tie
+        self.grace = grace
+        encoded = encode_data(data,label_column)
+        self.classes = encoded.classes.tolist()
+        self.values = {attribute:encoded.values[attribute].tolist() for attribute in encoded.values}
+        self.edges = {attribute:np.append(edges,np.inf) for attribute,edges in bin_data(encoded,bins)[1].items()}
+        self._codes = {attribute:{value_key(value):code for code,value in enumerate(values)} for attribute,values in self.values.items()}
+        self._class_codes = {label:code for code,label in enumerate(self.classes)}
+        #Every leaf has a slot in the histogram tables (one for each attribute, with a (bins/values × classes) matrix per slot)
+        self.tables = {attribute:np.zeros((1,len(edges),len(self.classes)),dtype=np.int64) for attribute,edges in self.edges.items()}
+        self.tables.update({attribute:np.zeros((1,len(values),len(self.classes)),dtype=np.int64) for attribute,values in self.values.items()})
+        self._slots = 0
+        self._free = []
+        #The nodes, by their position: their attribute and threshold (None for leaves), their children (positions, by value or side),
+        #their label, class counts, histogram slot (for leaves), depth and how many points they got since we last checked them
+        self.attribute,self.threshold,self.children,self.label = [],[],[],[]
+        self.counts,self.slot,self.depth,self.pending = [],[],[],[]
+        self._add_node(tree if tree is not None else (None,None,None),0)
+        self._learn(data,weights)
+        #Only the points that come after these count for checking the leaves again, and empty leaves (like a new tree's root) get their most common label
+        for node in range(len(self.attribute)):
+            self.pending[node] = 0
+            if self.attribute[node] is None and self.label[node] is None and self.counts[node].any():
+                self.label[node] = self.classes[self.counts[node].argmax()]
+    def _add_node(self,tree:tuple,depth:int)->int:
+        #Adds a tree's nodes to the table. Returns the position of its root
+        node = len(self.attribute)
+        self.attribute.append(tree[0] if tree[2] else None)
+        self.threshold.append(tree[1])
+        self.children.append(dict())
+        self.label.append(None if tree[2] else tree[0])
+        self.counts.append(np.zeros(len(self.classes),dtype=np.int64))
+        self.slot.append(-1 if tree[2] else self._new_slot())
+        self.depth.append(depth)
+        self.pending.append(0)
+        if tree[2]:
+            for key,child in tree[2].items():
+                if child is not None:
+                    self.children[node][key] = self._add_node(child,depth+1)
+        return node
+    def _new_slot(self)->int:
+        #Finds an empty slot in the histogram tables (making them twice as big if they're full)
+        if self._free:
+            return self._free.pop()
+        capacity = len(next(iter(self.tables.values())))
+        if self._slots==capacity:
+            self.tables = {attribute:np.concatenate([table,np.zeros_like(table)]) for attribute,table in self.tables.items()}
+        self._slots += 1
+        return self._slots-1
+    def _encode(self,data:pd.DataFrame)->tuple:
+        #Encodes rows with our tables, adding the labels and values we didn't know. Returns (columns,labels)
+        codes,uniques = pd.factorize(data[self.label_column])
+        for label in uniques:
+            if label not in self._class_codes:
+                self._add_class(label)
+        labels = np.array([self._class_codes[label] for label in uniques],dtype=np.int64)[codes]
+        columns = dict()
+        for attribute in self.edges:
+            columns[attribute] = data[attribute].to_numpy(dtype=float)
+        for attribute,known in self._codes.items():
+            #(Missing values are a value of their own, like in `encode_data`)
+            codes,uniques = pd.factorize(data[attribute],use_na_sentinel=False)
+            table = np.array([known.setdefault(value_key(value),len(known)) for value in uniques],dtype=np.int64)
+            self.values[attribute] += [value_key(value) for value in uniques if known[value_key(value)]>=len(self.values[attribute])]
+            if self.tables[attribute].shape[1]<len(self.values[attribute]):
+                self.tables[attribute] = np.pad(self.tables[attribute],((0,0),(0,len(self.values[attribute])-self.tables[attribute].shape[1]),(0,0)))
+            columns[attribute] = table[codes]
+        return (columns,labels)
+    def _add_class(self,label):
+        #A new label gets a new column in every node's counts and histograms
+        self._class_codes[label] = len(self.classes)
+        self.classes.append(label)
+        self.counts = [np.append(counts,0) for counts in self.counts]
+        self.tables = {attribute:np.pad(table,((0,0),(0,0),(0,1))) for attribute,table in self.tables.items()}
+    def _learn(self,data:pd.DataFrame,weights:np.ndarray)->list:
+        #Sends rows down the tree and adds them to the histograms of the leaves they reach (all leaves at once, for each attribute).
+        #Returns those leaves
+        columns,labels = self._encode(data)
+        weights = np.ones(len(data),dtype=np.int64) if weights is None else np.asarray(weights,dtype=np.int64)
+        slots = np.full(len(data),-1)
+        reached = []
+        self._route(0,np.arange(len(data)),columns,labels,weights,slots,reached)
+        n_classes = len(self.classes)
+        for attribute,table in self.tables.items():
+            column = columns[attribute]
+            if attribute in self.edges:
+                #(Values above the last edge, and missing ones, go to the extra bin)
+                bins = np.minimum(np.searchsorted(self.edges[attribute],column,side='left'),len(self.edges[attribute])-1)
+            else:
+                bins = column
+            valid = (slots>=0)&(bins>=0)
+            cells = (slots[valid]*table.shape[1]+bins[valid])*n_classes+labels[valid]
+            #(We only add to the cells that changed, so this doesn't depend on how big the tree is)
+            cells,positions = np.unique(cells,return_inverse=True)
+            table.reshape(-1)[cells] += np.bincount(positions,weights[valid]).astype(np.int64)
+        return reached
+    def _route(self,node:int,rows:np.ndarray,columns:dict,labels:np.ndarray,weights:np.ndarray,slots:np.ndarray,reached:list):
+        #Sends rows down from a node, counting them in every node they go through and marking the slot of the leaf they reach
+        if not len(rows):
+            return
+        self.counts[node] += np.bincount(labels[rows],weights[rows],minlength=len(self.classes)).astype(np.int64)
+        if self.attribute[node] is None:
+            slots[rows] = self.slot[node]
+            self.pending[node] += int(weights[rows].sum())
+            reached.append(node)
+            return
+        x = columns[self.attribute[node]][rows]
+        # If it's numerical
+        if self.threshold[node] is not None:
+            lessereq = x<=self.threshold[node]
+            self._route(self.children[node]['lessereq'],rows[lessereq],columns,labels,weights,slots,reached)
+            self._route(self.children[node]['greater'],rows[~lessereq],columns,labels,weights,slots,reached)
+        else:
+            #(Rows with values the node has no child for stop here, and children for values we don't know get nothing)
+            codes = self._codes[self.attribute[node]]
+            for value,child in self.children[node].items():
+                self._route(child,rows[x==codes.get(value_key(value),-2)],columns,labels,weights,slots,reached)
+    def _best_splits(self,node:int)->list:
+        #Each attribute's gain at a leaf, from its histograms, as (gain,attribute,threshold), the best first
+        gains = []
+        for attribute,table in self.tables.items():
+            histogram = table[self.slot[node]]
+            if not histogram.any():
+                continue
+            entropy = counts_entropy(histogram.sum(axis=0)[None,:])[0].item()
+            if attribute in self.edges:
+                attentropy,threshold = histogram_num_attribute_entropy(histogram,self.edges[attribute])
+            else:
+                attentropy,threshold = histogram_attribute_entropy(histogram),None
+            #(Splitting at the extra bin's edge doesn't separate anything)
+            if threshold is None or math.isfinite(threshold):
+                gains.append((entropy-attentropy,attribute,threshold))
+        return sorted(gains,key=lambda gain: -gain[0])
+    def _try_split(self,node:int)->bool:
+        #Splits a leaf if its statistics say it's worth it. Returns whether it did
+        self.pending[node] = 0
+        #The Hoeffding bound: how far the gains we measure can be from the real ones, with a probability of 1-delta
+        totals = next(iter(self.tables.values()))[self.slot[node]].sum(axis=0)
+        spread = math.log2(max(len(self.classes),2))
+        bound = math.sqrt(spread*spread*math.log(1/self.delta)/(2*max(totals.sum(),1)))
+        #No gain can be bigger than the leaf's own entropy, so we don't look at the attributes if that's already not enough
+        entropy = counts_entropy(totals[None,:])[0].item()
+        if (entropy<=bound and bound>=self.tie) or (self.depth[node]>=self.mindepth and entropy<self.info_thresh):
+            return False
+        gains = self._best_splits(node)
+        if not gains or gains[0][0]<=0:
+            return False
+        best,attribute,threshold = gains[0]
+        second = gains[1][0] if len(gains)>1 else 0
+        if self.depth[node]>=self.mindepth and best<self.info_thresh:
+            return False
+        if best-second<=bound and bound>=self.tie:
+            return False
+        #The children start with the class counts the split gives them
+        histogram = self.tables[attribute][self.slot[node]]
+        if threshold is not None:
+            last = int(np.searchsorted(self.edges[attribute],threshold))
+            subsets = [('lessereq',histogram[:last+1].sum(axis=0)),('greater',histogram[last+1:].sum(axis=0))]
+        else:
+            subsets = [(self.values[attribute][code],histogram[code]) for code in np.flatnonzero(histogram.any(axis=1))]
+        for key,counts in subsets:
+            child = self._add_node((self.classes[counts.argmax()],None,None),self.depth[node]+1)
+            self.counts[child] = counts.copy()
+            self.children[node][key] = child
+        #The leaf's slot is emptied for another one
+        for table in self.tables.values():
+            table[self.slot[node]] = 0
+        self._free.append(self.slot[node])
+        self.attribute[node],self.threshold[node],self.label[node],self.slot[node] = attribute,threshold,None,-1
+        return True
+    @timed('online update',lambda self,data,*args,**kwargs: len(data))
+    def update(self,data:pd.DataFrame,weights:np.ndarray=None)->int:
+        """
+        * `data:pd.DataFrame`: New labelled rows
+        * `weights:np.ndarray`: How many times each row counts (integers; by default, once)
+        Learns from new rows: each leaf they reach updates its label and statistics, and the ones that got at least `grace` new points
+        since they were last checked are split if it's worth it. Returns how many leaves were split
+        """
+        split = 0
+        for node in self._learn(data,weights):
+            self.label[node] = self.classes[self.counts[node].argmax()]
+            if self.pending[node]>=self.grace:
+                split += self._try_split(node)
+        return split
+    def _node(self,node:int)->tuple:
+        counts = dict(zip(self.classes,self.counts[node].tolist()))
+        if self.attribute[node] is None:
+            return (self.label[node],None,None,counts)
+        return (self.attribute[node],self.threshold[node],{key:self._node(child) for key,child in self.children[node].items()},counts)
+    @property
+    def tree(self)->tuple:
+        """
+        The current tree, with each node's class counts (see `annotate_tree`), so it can be pruned without the data
+        """
+        return self._node(0)
+
+class OnlineForest:
+    """
+    A forest whose trees are updated with new labelled rows (see `update`). The current trees are in `forest`.
+    * `trees`: Each tree's `OnlineTree`
+    * `generator`: The random generator for how many times each row counts for each tree
+    """
+    def __init__(self,forest:list,data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,seed:int=None,**options):
+        """
+        * `forest:list`: The forest we start from (trees that are None are left out)
+        * `data:pd.DataFrame`: The rows it was trained with
+        * `label_column:str`: The column we'll use as our labels
+        * `seed:int`: The seed for the rows' weights
+        * `options`: The other `OnlineTree` options (`bins`,`delta`,`tie` and `grace`)
+        Each tree starts with its own bootstrap-weighted share of the rows
+        """
+        self.generator = np.random.default_rng(seed)
+        self.trees = [OnlineTree(tree,data,label_column,mindepth,info_thresh,weights=self.generator.poisson(1,len(data)),**options) for tree in forest if tree is not None]
+    def update(self,data:pd.DataFrame)->int:
+        """
+        * `data:pd.DataFrame`: New labelled rows
+        Updates every tree with its bootstrap-weighted share of the new rows. Returns how many leaves were split in all trees
+        """
+        return sum(tree.update(data,self.generator.poisson(1,len(data))) for tree in self.trees)
+    @property
+    def forest(self)->list:
+        """
+        The current trees
+        """
+        return [tree.tree for tree in self.trees]
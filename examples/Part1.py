@@ -3,10 +3,40 @@ import numpy as np
 import math
 def set_entropy(labels:pd.Series)->float:
     """
-    * `labels:pd.Series`: The column corresponding to the labels on your dataset.
+    * `labels:pd.Series`: The column corresponding to the labels on your dataset (or an array with the integer-encoded labels).
     Calculates the entropy of a set of data points using their labels.
     """
-    # Firstly we extract the relative frequencies of each possible class
-    freqs = labels.value_counts(normalize=True)
-    # And return the opposite of the sum of the products of each frequency by its log2
-    return -sum([math.log2(pr)*pr for pr in freqs])
\ No newline at end of file
+    # Firstly we count how many points there are of each class (encoding the labels as integers, if they aren't yet)
+    if not isinstance(labels,np.ndarray):
+        labels = pd.factorize(labels)[0]
+        labels = labels[labels>=0]
+    # And calculate the entropy from those counts
+    return counts_entropy(np.bincount(labels)[None,:])[0].item()
+def counts_entropy(counts:np.ndarray)->np.ndarray:
+    """
+    * `counts:np.ndarray`: A (sets × classes) matrix with how many points of each class there are in each set.
+    Calculates the entropy of many sets at once using their class counts.
+    """
+    # We sort each set's counts in decreasing order so the terms are added in the same order as in `set_entropy`
+    counts = np.sort(counts,axis=1)[:,::-1]
+    sizes = np.maximum(counts.sum(axis=1),1)
+    # Then we add the products of each relative frequency by its log2 one class at a time, just like `sum` would
+    entropies = np.zeros(len(counts))
+    for column in counts.T:
+        freqs = column/sizes
+        # (Classes that aren't there don't count)
+        entropies += np.log2(freqs,out=np.zeros_like(freqs),where=freqs>0)*freqs
+    return -entropies
+def partition_entropy(counts:np.ndarray)->np.ndarray:
+    """
+    * `counts:np.ndarray`: A (... × subsets × classes) array with how many points of each class there are in each subset, for one or more ways of separating a set.
+    Calculates the attribute entropy (the weighted average of the subsets' entropies) of all of them at once.
+    """
+    sizes = counts.sum(axis=-1)
+    # We calculate all subsets' entropies and weigh them by their sizes
+    entropies = counts_entropy(counts.reshape(-1,counts.shape[-1])).reshape(sizes.shape)*(sizes/np.maximum(sizes.sum(axis=-1,keepdims=True),1))
+    # Then add them one subset at a time, just like `sum` would (empty subsets add nothing)
+    total = np.zeros(sizes.shape[:-1])
+    for subset in np.moveaxis(entropies,-1,0):
+        total += subset
+    return total
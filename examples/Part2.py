@@ -1,21 +1,45 @@
 import pandas as pd
 import numpy as np
 import math
-from Part1 import set_entropy
+from Part1 import set_entropy,partition_entropy
+from Dataset import EncodedData
+from Profiling import timed,first_length
+@timed('attribute_entropy',first_length)
 def attribute_entropy(data:pd.DataFrame,label_column:str,attribute:str)->float:
     """
-    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
     * `label_column:string`: The column we'll use as our labels
     * `attribute:string`: The column we'll use as our subset-generating attribute
     Calculates the Attribute Entropy for labelled set
     """
+    if isinstance(data,EncodedData):
+        if not data.is_categorical(attribute):
+            return None
+        return coded_attribute_entropy(data.column(attribute),data.label_codes())
     if data[attribute].dtype!=object:
         return None
-    #Firstly, we list all possible values for the attribute
-    possible_values = {value for value in data[attribute]}
-    #Then we separate the subsets
-    subsets = [data[data[attribute]==value] for value in possible_values]
-    #Then we calculate each set's entropy
-    entropies = [set_entropy(subset[label_column]) for subset in subsets]
-    #And we return the weighted sum of all entropies
-    return sum([entropies[i]*(len(subsets[i])/len(data)) for i in range(len(subsets))])
\ No newline at end of file
+    #Firstly, we encode the attribute's values and the labels as integers
+    codes = pd.factorize(data[attribute],use_na_sentinel=False)[0]
+    labels = pd.factorize(data[label_column])[0]
+    #Then we count each value's classes and calculate the weighted sum of all entropies, all at once
+    return coded_attribute_entropy(codes,labels)
+def coded_attribute_entropy(codes:np.ndarray,labels:np.ndarray)->float:
+    """
+    * `codes:np.ndarray`: The integer-encoded values of a categorical attribute
+    * `labels:np.ndarray`: The integer-encoded labels for the same points
+    Calculates the Attribute Entropy for an integer-encoded categorical attribute
+    """
+    #(An empty set has no entropy, and no classes to count)
+    if not len(labels):
+        return 0
+    #We count the points of each class for each possible value, all at once
+    n_classes = labels.max()+1
+    counts = np.bincount(codes*n_classes+labels,minlength=(codes.max()+1)*n_classes).reshape(-1,n_classes)
+    return histogram_attribute_entropy(counts)
+def histogram_attribute_entropy(counts:np.ndarray)->float:
+    """
+    * `counts:np.ndarray`: A (values × classes) matrix with how many points of each class have each value of the attribute
+    Calculates the Attribute Entropy for a categorical attribute from its class counts
+    """
+    #(Values that don't appear in this subset don't generate subsets, so they add nothing)
+    return partition_entropy(counts).item()
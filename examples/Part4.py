@@ -1,22 +1,116 @@
 import pandas as pd
 import numpy as np
 import math
-from Part1 import set_entropy
-from Part2 import attribute_entropy
-from Part3 import minimum_num_attribute_entropy
-def best_split(data:pd.DataFrame,label_column:str)->tuple:
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Part1 import set_entropy,counts_entropy
+from Part2 import attribute_entropy,histogram_attribute_entropy
+from Part3 import matrix_num_attribute_entropy,sorted_num_attribute_entropy,histogram_num_attribute_entropy
+from Dataset import EncodedData
+from Profiling import timed,first_length
+import Caching
+from Caching import fingerprint
+# Thread pools for `best_split`, kept between calls (it runs at every node), by number of threads. They're shut down when the program exits
+_pools = dict()
+_pools_lock = threading.Lock()
+# How many counts (points × attributes × classes) we'll sweep at once at most, so wide data sets don't need too much memory
+SWEEP_SIZE = 2**16
+def _thread_pool(n_jobs:int)->ThreadPoolExecutor:
+    with _pools_lock:
+        if n_jobs not in _pools:
+            _pools[n_jobs] = ThreadPoolExecutor(n_jobs,thread_name_prefix='best_split')
+        return _pools[n_jobs]
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
+@timed('best_split',first_length)
+def best_split(data:pd.DataFrame,label_column:str,n_jobs:int=1)->tuple:
     """
-    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
     * `label_column:str`: The column we'll use as our labels
+    * `n_jobs:int`: How many threads will calculate the attribute entropies (NumPy lets go of the GIL while it works, so they run at the same time)
     Calculates the best possible split. Returns (attribute,threshold/None,gain)
     """
+    #We calculate the set entropy (straight from the arrays if the data is encoded)
+    if isinstance(data,EncodedData):
+        labels = data.label_codes()
+        entropy = set_entropy(labels)
+        attributes = data.attributes
+        categorical = [data.is_categorical(attribute) for attribute in attributes]
+        dtypes = [data.columns[attribute].dtype for attribute in attributes]
+        column = data.column
+    else:
+        entropy = set_entropy(data[label_column])
+        attributes = [column for column in data.columns if column!=label_column]
+        labels = pd.factorize(data[label_column])[0]
+        dtypes = [data[attribute].dtype for attribute in attributes]
+        categorical = [dtype == object for dtype in dtypes]
+        column = lambda attribute: data[attribute].to_numpy()
+    #If there's a split cache, we take what's there already (see Caching.py)
+    entropies = [None]*len(attributes)
+    cache = Caching._active if isinstance(data,EncodedData) else None
+    if cache is not None:
+        subset = fingerprint(data)
+        entropies = [cache.get((subset,attribute)) for attribute in attributes]
+    #The numerical attributes are swept together, as matrices of columns with the same dtype (in groups small enough to fit in SWEEP_SIZE)
+    same_dtype = dict()
+    for i,dtype in enumerate(dtypes):
+        if not categorical[i] and entropies[i] is None:
+            same_dtype.setdefault(dtype,[]).append(i)
+    width = max(1,SWEEP_SIZE//(len(labels)*(labels.max()+1)))
+    groups = [same[j:j+width] for same in same_dtype.values() for j in range(0,len(same),width)]
+    groups += [[i] for i in range(len(attributes)) if categorical[i] and entropies[i] is None]
+    def evaluate(group:list)->list:
+        if categorical[group[0]]:
+            return [(attribute_entropy(data,label_column,attributes[group[0]]),None)]
+        return matrix_num_attribute_entropy(np.column_stack([column(attributes[i]) for i in group]),labels)
+    results = _thread_pool(n_jobs).map(evaluate,groups) if n_jobs>1 and len(groups)>1 else map(evaluate,groups)
+    #Then we put the attribute entropies back in order
+    for group,result in zip(groups,results):
+        for i,ent in zip(group,result):
+            entropies[i] = ent
+            if cache is not None:
+                cache.put((subset,attributes[i]),ent)
+    #Then the gains
+    gains = [(entropy-ent[0],i) for i,ent in enumerate(entropies)]
+    #Then we return the maximum (the last attribute if there's a tie, just like sorting the gains in reverse would)
+    maximum = max(gains)
+    return (attributes[maximum[1]],entropies[maximum[1]][1],maximum[0])
+@timed('presorted_best_split',first_length)
+def presorted_best_split(data:EncodedData,orders:dict)->tuple:
+    """
+    * `data:EncodedData`: The (sub)set we're using as our reference.
+    * `orders:dict`: For each numerical attribute, the rows in this subset already sorted by that attribute
+    Calculates the best possible split without sorting anything. Returns (attribute,threshold/None,gain)
+    """
     #We calculate the set entropy
-    entropy = set_entropy(data[label_column])
+    entropy = set_entropy(data.label_codes())
+    #And the attribute entropies
+    attributes = data.attributes
+    entropies = [sorted_num_attribute_entropy(data.columns[attribute][orders[attribute]],data.labels[orders[attribute]]) if attribute in orders else (attribute_entropy(data,data.label_column,attribute),None) for attribute in attributes]
+    #Then the gains
+    gains = [(entropy-ent[0],i) for i,ent in enumerate(entropies)]
+    #Then we return the maximum
+    maximum = max(gains)
+    return (attributes[maximum[1]],entropies[maximum[1]][1],maximum[0])
+@timed('histogram_best_split')
+def histogram_best_split(histograms:dict,edges:dict)->tuple:
+    """
+    * `histograms:dict`: For each attribute, a (bins/values × classes) matrix with the class counts of the (sub)set (see `class_histograms`)
+    * `edges:dict`: For each numerical attribute, its bins' upper edges (see `bin_data`)
+    Calculates the best possible split using only the class histograms, without looking at the points. Returns (attribute,threshold/None,gain)
+    """
+    #We calculate the set entropy (any attribute's histogram has all the points)
+    attributes = list(histograms)
+    entropy = counts_entropy(histograms[attributes[0]].sum(axis=0)[None,:])[0].item()
     #And the attribute entropies
-    attributes = [column for column in data.columns if column!=label_column]
-    entropies = [(attribute_entropy(data,label_column,attribute),None) if data[attribute].dtype == object else minimum_num_attribute_entropy(data,label_column,attribute) for attribute in attributes]
+    entropies = [histogram_num_attribute_entropy(histograms[attribute],edges[attribute]) if attribute in edges else (histogram_attribute_entropy(histograms[attribute]),None) for attribute in attributes]
     #Then the gains
     gains = [(entropy-ent[0],i) for i,ent in enumerate(entropies)]
-    #Then we return the minimum
-    minimum = sorted(gains,reverse=True)[0]
-    return (attributes[minimum[1]],entropies[minimum[1]][1],minimum[0])
\ No newline at end of file
+    #Then we return the maximum
+    maximum = max(gains)
+    return (attributes[maximum[1]],entropies[maximum[1]][1],maximum[0])
@@ -1,39 +1,292 @@
 import pandas as pd
 import numpy as np
 import math
-from Part4 import best_split
-def generate_tree(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,level:int=0)->tuple:
+from Part1 import counts_entropy,partition_entropy
+from Part4 import best_split,presorted_best_split,histogram_best_split
+from Dataset import EncodedData,encode_data,bin_data,class_histograms
+from Profiling import timed,first_length,count_node
+from Inference import value_key
+def generate_tree(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,level:int=0,presort:bool=False,bins:int=0,n_jobs:int=1,max_leaves:int=0,counts:bool=False)->tuple:
     """
-    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
     * `label_column:str`: The column we'll use as our labels
     * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
     * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    * `presort:bool`: Whether to sort the numerical attributes only once and reuse that order for the whole tree (see `generate_tree_presorted`)
+    * `bins:int`: If given, numerical attributes are split into this many quantile bins and only the bins' edges are tested as thresholds (see `generate_tree_binned`)
+    * `n_jobs:int`: How many threads `best_split` uses at each node (worth it for data sets with many attributes)
+    * `max_leaves:int`: If given, the tree is grown one level at a time and stops splitting when it'd have more leaves than this (see `generate_tree_levelwise`)
+    * `counts:bool`: Whether to record how many training points of each class reach each node (see `annotate_tree`), so the tree can be pruned without the data
     Generates a decision tree based on the given parameters
     .
     """
+    if counts:
+        if not isinstance(data,EncodedData):
+            data = encode_data(data,label_column)
+        return annotate_tree(generate_tree(data,label_column,mindepth,info_thresh,level,presort,bins,n_jobs,max_leaves),data,label_column)
+    if max_leaves:
+        return generate_tree_levelwise(data,label_column,mindepth,info_thresh,max_leaves,bins,level)
+    if bins:
+        return generate_tree_binned(data,label_column,mindepth,info_thresh,bins,level)
+    if presort:
+        return generate_tree_presorted(data,label_column,mindepth,info_thresh,level)
+    #We encode the data set only once, and all nodes work on subsets of it
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
     #If there's nothing there, we can't do much
     if len(data) == 0:
         return (None,None,None)
+    count_node(level,len(data))
     #Finds the best split
-    bs = best_split(data,label_column)
+    bs = best_split(data,label_column,n_jobs)
     #If it's below the minimum depth and the split isn't worth it
     if level>=mindepth and bs[2]<info_thresh:
         #Return the most common label and become a leaf
-        return (data[label_column].mode()[0],None,None)
+        return (data.mode(),None,None)
     
     children = dict()
+    column = data.column(bs[0])
     #If it's a categorical attribute
-    if data[bs[0]].dtype == object:
+    if data.is_categorical(bs[0]):
         #Find all possible values
-        values = {value for value in data[bs[0]]}
+        codes = np.unique(column)
         #Generate a tree for each one
-        children = {value:generate_tree(data[data[bs[0]]==value],label_column,mindepth,info_thresh,level+1) for value in values}
+        children = {data.values[bs[0]][code]:generate_tree(data.where(column==code),label_column,mindepth,info_thresh,level+1,n_jobs=n_jobs) for code in codes}
     else:
         #Generates the tree for the lesser/equal subset
-        children['lessereq'] = generate_tree(data[data[bs[0]]<=bs[1]],label_column,mindepth,info_thresh,level+1)
+        children['lessereq'] = generate_tree(data.where(column<=bs[1]),label_column,mindepth,info_thresh,level+1,n_jobs=n_jobs)
         #Generates the tree for the greater subset
-        children['greater'] = generate_tree(data[data[bs[0]]>bs[1]],label_column,mindepth,info_thresh,level+1)
+        children['greater'] = generate_tree(data.where(column>bs[1]),label_column,mindepth,info_thresh,level+1,n_jobs=n_jobs)
     return (bs[0],bs[1],children)
+@timed('generate_tree_presorted',first_length)
+def generate_tree_presorted(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,level:int=0)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
+    * `label_column:str`: The column we'll use as our labels
+    * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
+    * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    Generates the same tree as `generate_tree`, but sorts each numerical attribute only once (at the root).
+    Each node then splits those sorted lists of rows between its children, keeping them sorted,
+    so no node has to sort or copy the data set again.
+    """
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
+    #We sort the rows by each numerical attribute (only this once)
+    orders = {attribute:data.rows[np.argsort(data.column(attribute),kind='stable')] for attribute in data.attributes if not data.is_categorical(attribute)}
+    #This is a scratch space for marking which rows go to each side of a split
+    marks = np.zeros(len(data.labels),dtype=bool)
+    return _grow_presorted(data,orders,marks,mindepth,info_thresh,level)
+def _grow_presorted(data:EncodedData,orders:dict,marks:np.ndarray,mindepth:int,info_thresh:float,level:int)->tuple:
+    #If there's nothing there, we can't do much
+    if len(data) == 0:
+        return (None,None,None)
+    count_node(level,len(data))
+    #Finds the best split
+    bs = presorted_best_split(data,orders)
+    #If it's below the minimum depth and the split isn't worth it
+    if level>=mindepth and bs[2]<info_thresh:
+        #Return the most common label and become a leaf
+        return (data.mode(),None,None)
+    column = data.columns[bs[0]]
+    rows = data.rows
+    #If it's a categorical attribute
+    if data.is_categorical(bs[0]):
+        #There's a subset for each value that's there, and each one keeps the other attributes' sorted lists
+        subsets = [(data.values[bs[0]][code],rows[column[rows]==code],{attribute:order[column[order]==code] for attribute,order in orders.items()}) for code in np.unique(column[rows])]
+    else:
+        #Mark the rows in the lesser/equal subset
+        lessereq = column[rows]<=bs[1]
+        marks[rows[lessereq]] = True
+        #And split each sorted list between both sides (filtering keeps them sorted)
+        subsets = [('lessereq',rows[lessereq],{attribute:order[marks[order]] for attribute,order in orders.items()}),
+                   ('greater',rows[~lessereq],{attribute:order[~marks[order]] for attribute,order in orders.items()})]
+        marks[rows[lessereq]] = False
+    #Our sorted lists were all split between the children, so we can let go of them
+    orders.clear()
+    #Generates the tree for each subset
+    children = {name:_grow_presorted(data.subset(subset),suborders,marks,mindepth,info_thresh,level+1) for name,subset,suborders in subsets}
+    return (bs[0],bs[1],children)
+@timed('generate_tree_binned',first_length)
+def generate_tree_binned(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,bins:int,level:int=0)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
+    * `label_column:str`: The column we'll use as our labels
+    * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
+    * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    * `bins:int`: The maximum number of bins for each numerical attribute
+    Generates an approximate decision tree for big data sets. Each numerical attribute is split into quantile bins only once (at the root),
+    and each node finds its split from how many points of each class there are in each bin. Those counts are only made for the smaller
+    children: the biggest child's are its parent's minus its siblings'. Attributes with up to `bins` distinct values are still split exactly.
+    """
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
+    binned,edges = bin_data(data,bins)
+    return _grow_binned(data,binned,edges,class_histograms(data,binned,edges),mindepth,info_thresh,level)
+def _grow_binned(data:EncodedData,binned:dict,edges:dict,histograms:dict,mindepth:int,info_thresh:float,level:int)->tuple:
+    #If there's nothing there, we can't do much
+    if len(data) == 0:
+        return (None,None,None)
+    count_node(level,len(data))
+    #Finds the best split
+    bs = histogram_best_split(histograms,edges)
+    #If it's below the minimum depth and the split isn't worth it
+    if level>=mindepth and bs[2]<info_thresh:
+        #Return the most common label and become a leaf
+        return (data.mode(),None,None)
+    column = data.column(bs[0])
+    #If it's a categorical attribute, there's a subset for each value that's there
+    if data.is_categorical(bs[0]):
+        subsets = [(data.values[bs[0]][code],data.where(column==code)) for code in np.unique(column)]
+    else:
+        lessereq = column<=bs[1]
+        subsets = [('lessereq',data.where(lessereq)),('greater',data.where(~lessereq))]
+    #We count the classes in the smaller subsets
+    biggest = max(range(len(subsets)),key=lambda i: len(subsets[i][1]))
+    subhistograms = [None if i==biggest else class_histograms(subset,binned,edges) for i,(name,subset) in enumerate(subsets)]
+    #And the biggest one gets what's left of ours
+    for other in subhistograms:
+        if other is not None:
+            for attribute in histograms:
+                histograms[attribute] -= other[attribute]
+    subhistograms[biggest] = histograms
+    #Generates the tree for each subset
+    children = {name:_grow_binned(subset,binned,edges,subhistograms[i],mindepth,info_thresh,level+1) for i,(name,subset) in enumerate(subsets)}
+    return (bs[0],bs[1],children)
+@timed('generate_tree_levelwise',first_length)
+def generate_tree_levelwise(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,max_leaves:int=0,bins:int=0,level:int=0)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`).
+    * `label_column:str`: The column we'll use as our labels
+    * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
+    * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    * `max_leaves:int`: If given, the maximum number of leaves. When splitting every node in a level would go over it, the nodes with the biggest gains are split first,
+      and the ones that don't fit become leaves
+    * `bins:int`: If given, numerical attributes are split into this many quantile bins (see `generate_tree_binned`)
+    Generates the same tree as `generate_tree` (or `generate_tree_binned`), but one level at a time instead of recursively, so its depth has no limit.
+    The open nodes of a level are kept in a queue, each one with its range of a single array of rows, and their splits are found
+    all at once, with a single sweep through each column for the whole level.
+    """
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
+    if len(data) == 0:
+        return (None,None,None)
+    binned,edges = bin_data(data,bins) if bins else (None,dict())
+    #The open nodes' rows (each node's in a range, from starts[i] to starts[i+1]) and where they'll go in the tree (their parent's children and their key)
+    rows = data.rows
+    starts = np.array([0,len(rows)])
+    tree = dict()
+    places = [(tree,None)]
+    leaves = 1
+    #The open rows sorted by each (unbinned) numerical attribute (only this once, then the rows that are left keep their order), and each row's node
+    orders = {attribute:rows[np.argsort(data.column(attribute),kind='stable')] for attribute in data.attributes if not data.is_categorical(attribute) and attribute not in edges}
+    node_of = np.full(len(data.labels),-1,dtype=np.int32)
+    while places:
+        #We find the best split for every open node
+        nodes = np.repeat(np.arange(len(places),dtype=np.int32),np.diff(starts))
+        node_of[rows] = nodes
+        for attribute,order in orders.items():
+            orders[attribute] = order[node_of[order]>=0]
+        attributes,thresholds,gains,totals = _level_splits(data,rows,starts,nodes,orders,node_of,binned,edges)
+        #The nodes that should be split, with the biggest gains first (if there's a budget, only those that fit in it will be)
+        splitting = sorted((i for i in range(len(places)) if level<mindepth or gains[i]>=info_thresh),key=lambda i: -gains[i])
+        children = dict()
+        for i in splitting:
+            column = data.columns[attributes[i]][rows[starts[i]:starts[i+1]]]
+            #Each child's number: a categorical attribute's values that are there in order, or lesser/equal and greater
+            if data.is_categorical(attributes[i]):
+                codes,child = np.unique(column,return_inverse=True)
+                keys = [data.values[attributes[i]][code] for code in codes]
+            else:
+                child = (column>thresholds[i]).astype(np.intp)
+                keys = ['lessereq','greater']
+            if max_leaves and leaves+len(keys)-1>max_leaves:
+                continue
+            leaves += len(keys)-1
+            children[i] = (keys,child)
+        #Then we make the nodes, and the children that aren't empty go to the next level (in order, so each one's rows are together again)
+        next_rows = []
+        next_places = []
+        for i,(parent,key) in enumerate(places):
+            count_node(level,starts[i+1]-starts[i])
+            if i not in children:
+                parent[key] = (data.classes[totals[i].argmax()],None,None)
+                continue
+            keys,child = children[i]
+            parent[key] = (attributes[i],thresholds[i],dict.fromkeys(keys))
+            segment = rows[starts[i]:starts[i+1]]
+            order = np.argsort(child,kind='stable')
+            for number,size in enumerate(np.bincount(child,minlength=len(keys))):
+                if size == 0:
+                    parent[key][2][keys[number]] = (None,None,None)
+                else:
+                    next_rows.append(segment[order[:size]])
+                    next_places.append((parent[key][2],keys[number]))
+                order = order[size:]
+        node_of[rows] = -1
+        rows = np.concatenate(next_rows) if next_rows else rows[:0]
+        starts = np.cumsum([0]+[len(subset) for subset in next_rows])
+        places = next_places
+        level += 1
+    return tree[None]
+@timed('level splits')
+def _level_splits(data:EncodedData,rows:np.ndarray,starts:np.ndarray,nodes:np.ndarray,orders:dict,node_of:np.ndarray,binned:dict,edges:dict)->tuple:
+    #Finds the best split for all nodes in a level at once (the same one `best_split`/`histogram_best_split` would).
+    #Returns each node's attribute, threshold and gain, and its class counts
+    labels = data.labels[rows]
+    n_nodes,n_classes = len(starts)-1,len(data.classes)
+    totals = np.bincount(nodes*n_classes+labels,minlength=n_nodes*n_classes).reshape(n_nodes,n_classes)
+    entropies = []
+    thresholds = []
+    for attribute in data.attributes:
+        if data.is_categorical(attribute):
+            #The class counts of each value in each node
+            n_values = len(data.values[attribute])
+            counts = np.bincount((nodes*n_values+data.columns[attribute][rows])*n_classes+labels,minlength=n_nodes*n_values*n_classes).reshape(n_nodes,n_values,n_classes)
+            entropies.append(partition_entropy(counts))
+            thresholds.append(None)
+        elif attribute in edges:
+            ent,threshold = _level_binned_entropies(binned[attribute][rows],nodes,labels,n_nodes,edges[attribute],n_classes)
+            entropies.append(ent)
+            thresholds.append(threshold)
+        else:
+            #The rows are already sorted by value, so sorting them by node (stably, which is fast for small integers) sorts them by node and then by value
+            order = orders[attribute]
+            order = order[np.argsort(node_of[order].astype(np.int16) if n_nodes<2**15 else node_of[order],kind='stable')]
+            ent,threshold = _level_num_entropies(data.columns[attribute][order],data.labels[order],node_of[order],starts,totals)
+            entropies.append(ent)
+            thresholds.append(threshold)
+    #The best attribute has the biggest gain (the last one if there's a tie, just like in `best_split`)
+    gains = counts_entropy(totals)[:,None]-np.stack(entropies,axis=1)
+    best = gains.shape[1]-1-np.argmax(gains[:,::-1],axis=1)
+    attributes = [data.attributes[a] for a in best]
+    return (attributes,[None if thresholds[a] is None else thresholds[a][i].item() for i,a in enumerate(best)],gains[np.arange(n_nodes),best].tolist(),totals)
+def _level_num_entropies(values:np.ndarray,labels:np.ndarray,nodes:np.ndarray,starts:np.ndarray,totals:np.ndarray)->tuple:
+    #Sweeps a numerical attribute for all nodes in a level at once (with the rows sorted by node and then by value):
+    #the class counts at or before each row are its node's part of the cumulative counts. Returns each node's minimum entropy and threshold
+    #Only the last occurrence of each distinct value in a node is a threshold
+    last = np.flatnonzero(np.append((values[1:]!=values[:-1])|(nodes[1:]!=nodes[:-1]),True))
+    cumulative = np.zeros((len(values)+1,totals.shape[1]),dtype=np.int32)
+    cumulative[np.arange(1,len(values)+1),labels] = 1
+    np.cumsum(cumulative,axis=0,out=cumulative)
+    lessereq = cumulative[last+1]-cumulative[starts[nodes[last]]]
+    greater = totals[nodes[last]]-lessereq
+    entropies = partition_entropy(np.stack((lessereq,greater),axis=1))
+    #Each node's first minimum (the one with the smallest threshold)
+    segments = np.searchsorted(nodes[last],np.arange(len(starts)-1))
+    minimum = np.minimum.reduceat(entropies,segments)
+    first = np.flatnonzero(entropies==np.repeat(minimum,np.diff(np.append(segments,len(last)))))
+    first = first[np.unique(nodes[last[first]],return_index=True)[1]]
+    return (entropies[first],values[last[first]])
+def _level_binned_entropies(bins:np.ndarray,nodes:np.ndarray,labels:np.ndarray,n_nodes:int,edges:np.ndarray,n_classes:int)->tuple:
+    #Counts the classes in each bin for all nodes in a level at once, and finds each node's minimum entropy and threshold (like `histogram_num_attribute_entropy`)
+    counts = np.bincount((nodes*len(edges)+bins)*n_classes+labels,minlength=n_nodes*len(edges)*n_classes).reshape(n_nodes,len(edges),n_classes)
+    lessereq = np.cumsum(counts,axis=1)
+    greater = lessereq[:,-1:]-lessereq
+    entropies = partition_entropy(np.stack((lessereq,greater),axis=2))
+    #Only the edges of bins with points in them are thresholds
+    entropies[~counts.any(axis=2)] = np.inf
+    best = np.argmin(entropies,axis=1)
+    return (entropies[np.arange(n_nodes),best],edges[best])
 def classify_point(point:pd.Series,tree:tuple)->str:
     """
     * `point:pd.Series`: A data row
@@ -48,10 +301,46 @@ def classify_point(point:pd.Series,tree:tuple)->str:
         return None
     else:
         # If it's numerical
-        if tree[1]:
+        if tree[1] is not None:
             if point[tree[0]]<=tree[1]:
                 return classify_point(point,tree[2]['lessereq'])
             else:
                 return classify_point(point,tree[2]['greater'])
+        #(A missing value goes to the tree's own missing value, since NaN isn't equal to itself)
+        value = point[tree[0]]
+        if value_key(value) is math.nan:
+            value = next((key for key in tree[2] if value_key(key) is math.nan),value)
+        #If the tree has never seen its value, it can't classify it either
+        if value not in tree[2]:
+            return None
         else:
-            return classify_point(point,tree[2][point[tree[0]]])
\ No newline at end of file
+            return classify_point(point,tree[2][value])
+@timed('annotate_tree',lambda tree,data,label_column: len(data))
+def annotate_tree(tree:tuple,data:pd.DataFrame,label_column:str)->tuple:
+    """
+    * `tree:tuple`: A tree
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`)
+    * `label_column:str`: The column we'll use as our labels
+    Sends the data set down the tree once, counting how many points of each class reach each node.
+    Returns a copy of the tree whose nodes have those counts as a fourth element, as a dict with every class (in sorted order) and its count
+    """
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
+    return _annotate(tree,data)
+def _annotate(tree:tuple,data:EncodedData)->tuple:
+    if tree is None:
+        return None
+    counts = dict(zip(data.classes.tolist(),np.bincount(data.label_codes(),minlength=len(data.classes)).tolist()))
+    # If there's no children, it's a leaf.
+    if not tree[2]:
+        return tree[:3]+(counts,)
+    column = data.column(tree[0])
+    # If it's numerical
+    if tree[1] is not None:
+        lessereq = column<=tree[1]
+        children = {'lessereq':_annotate(tree[2]['lessereq'],data.where(lessereq)),'greater':_annotate(tree[2]['greater'],data.where(~lessereq))}
+    else:
+        #(Values the data set doesn't have reach their children with no points)
+        codes = {value_key(value):code for code,value in enumerate(data.values[tree[0]])}
+        children = {value:_annotate(child,data.where(column==codes.get(value_key(value),-1))) for value,child in tree[2].items()}
+    return (tree[0],tree[1],children,counts)
@@ -0,0 +1,178 @@
+"""
+Optional instrumentation for training: how long each phase takes, how many times it runs and how many rows it goes through,
+how many nodes there are at each depth and how big they are, and the peak memory.
+
+Nothing is recorded unless a profile is active: run the training inside `with profiling() as profile:` and then look at `profile.report()`
+(`generate_forest` also does it for you with `profile=True`). Otherwise the instrumented functions only check that there's no profile.
+"""
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+# The profile being recorded, if any
+_active = None
+
+class Profile:
+    """
+    What was recorded while a profile was active (see `profiling`).
+    * `calls`,`seconds`,`rows`: For each phase, how many times it ran, its total wall time (recursive calls are only timed once,
+      by the outermost one) and how many rows it went through
+    It can be recorded from many threads at once (`best_split` with `n_jobs`, for example): each thread times its own calls
+    * `depths`: How many nodes were made at each depth
+    * `node_rows`: How many rows all those nodes had, in total, and the biggest one
+    """
+    def __init__(self):
+        self.calls = dict()
+        self.seconds = dict()
+        self.rows = dict()
+        self.depths = dict()
+        self.node_rows = [0,0]
+        self.start = time.perf_counter()
+        self.end = None
+        self.peak = 0
+        self._lock = threading.Lock()
+        #The phases each thread is timing right now (a call from another thread isn't a recursive one)
+        self._threads = threading.local()
+    def add(self,phase:str,seconds:float=0,rows:int=0,calls:int=1):
+        with self._lock:
+            self.calls[phase] = self.calls.get(phase,0)+calls
+            self.seconds[phase] = self.seconds.get(phase,0)+seconds
+            if rows:
+                self.rows[phase] = self.rows.get(phase,0)+rows
+    def node(self,depth:int,rows:int):
+        with self._lock:
+            self.depths[depth] = self.depths.get(depth,0)+1
+            self.node_rows[0] += rows
+            self.node_rows[1] = max(self.node_rows[1],rows)
+    def run(self,phase:str,function,args:tuple,kwargs:dict,rows=None):
+        #Runs an instrumented function
+        opened = getattr(self._threads,'open',None)
+        if opened is None:
+            opened = self._threads.open = set()
+        if phase in opened:
+            #(A recursive call is already being timed by the outermost one)
+            self.add(phase,rows=rows(*args,**kwargs) if rows else 0)
+            return function(*args,**kwargs)
+        opened.add(phase)
+        start = time.perf_counter()
+        try:
+            return function(*args,**kwargs)
+        finally:
+            opened.discard(phase)
+            self.add(phase,time.perf_counter()-start,rows(*args,**kwargs) if rows else 0)
+    def merge(self,report:dict):
+        """
+        * `report:dict`: Another profile's report (from a worker process, for example)
+        Adds what another profile recorded to this one
+        """
+        for phase,stats in report['phases'].items():
+            self.add(phase,stats['seconds'],stats.get('rows',0),stats['calls'])
+        for depth,count in report['nodes']['by depth'].items():
+            self.depths[int(depth)] = self.depths.get(int(depth),0)+count
+        self.node_rows[0] += report['nodes']['rows']
+        self.node_rows[1] = max(self.node_rows[1],report['nodes']['biggest'])
+        self.peak = max(self.peak,report['peak MiB'])
+    def report(self)->dict:
+        """
+        Returns what was recorded as a dict (which can be saved as JSON): the total wall time, each phase's calls, time (in seconds and
+        as a share of the total) and rows, the nodes at each depth and their rows (in total, on average and the biggest one) and the peak memory
+        (the resident set size of this process, or of the biggest worker, in MiB)
+        """
+        wall = (self.end or time.perf_counter())-self.start
+        nodes = sum(self.depths.values())
+        phases = {phase:{'calls':self.calls[phase],'seconds':self.seconds[phase],'share':self.seconds[phase]/wall if wall else 0}
+                  for phase in sorted(self.calls,key=lambda phase: -self.seconds[phase])}
+        for phase,rows in self.rows.items():
+            phases[phase]['rows'] = rows
+        return {'wall seconds':wall,
+                'phases':phases,
+                'nodes':{'total':nodes,'by depth':dict(sorted(self.depths.items())),'rows':self.node_rows[0],
+                         'mean rows':self.node_rows[0]/nodes if nodes else 0,'biggest':self.node_rows[1]},
+                'peak MiB':max(self.peak,peak_rss())}
+
+@contextmanager
+def profiling():
+    """
+    Records a profile of everything that runs inside the `with` block. Yields the `Profile`
+    """
+    global _active
+    previous,_active = _active,Profile()
+    try:
+        yield _active
+    finally:
+        _active.end = time.perf_counter()
+        _active = previous
+
+def timed(phase:str,rows=None):
+    """
+    * `phase:str`: The phase's name in the report
+    * `rows`: A function that takes the same arguments and returns how many rows the call goes through (if we want to count them)
+    Decorates a function so its calls are recorded as a phase while a profile is active.
+    (Recursive functions are better left alone: every call would take two stack frames)
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def instrumented(*args,**kwargs):
+            if _active is None:
+                return function(*args,**kwargs)
+            return _active.run(phase,function,args,kwargs,rows)
+        return instrumented
+    return decorator
+
+def first_length(first,*args,**kwargs)->int:
+    """
+    Counts the rows of a function's first argument (for `timed`)
+    """
+    return len(first)
+
+@contextmanager
+def phase(name:str,rows:int=0):
+    """
+    * `name:str`: The phase's name in the report
+    * `rows:int`: How many rows it goes through
+    Records the `with` block as a phase while a profile is active
+    """
+    profile = _active
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.add(name,time.perf_counter()-start,rows)
+
+def count_node(depth:int,rows:int):
+    """
+    * `depth:int`: The node's depth
+    * `rows:int`: How many rows it has
+    Records a new tree node while a profile is active
+    """
+    if _active is not None:
+        _active.node(depth,rows)
+
+def peak_rss()->float:
+    """
+    Returns the peak resident set size of this process, in MiB
+    """
+    #Linux keeps it in /proc (getrusage's includes the parent's, if it was bigger when we started)
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/2**10
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/2**10
+
+def reset_peak_rss()->bool:
+    """
+    Resets this process's peak resident set size to its current one (so `peak_rss` measures from now on), where Linux allows it.
+    Returns whether it did
+    """
+    try:
+        with open('/proc/self/clear_refs','w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
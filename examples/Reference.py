@@ -0,0 +1,127 @@
+"""
+The original, straightforward implementations from the guide.
+They're slower than the ones in the Part files, but easier to follow, so
+we keep them here as a reference for checking and benchmarking the optimised versions.
+"""
+import pandas as pd
+import numpy as np
+import math
+from Compiled import predict_batch
+def set_entropy(labels:pd.Series)->float:
+    """
+    * `labels:pd.Series`: The column corresponding to the labels on your dataset.
+    Calculates the entropy of a set of data points using their labels.
+    """
+    freqs = labels.value_counts(normalize=True)
+    return -sum([math.log2(pr)*pr for pr in freqs])
+def num_attribute_entropy(data:pd.DataFrame,label_column:str,attribute:str,threshold:float)->float:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `label_column:str`: The column we'll use as our labels
+    * `attribute:str`: The column we'll use as our subset-generating attribute
+    * `threshold:float`: The threshold we'll use for separating the subsets.
+    Calculates the attribute entropy for a numerical attribute
+    """
+    if not data[attribute].dtype in ['float','int']:
+        return None
+    lessereq = data[data[attribute]<=threshold]
+    greater = data[data[attribute]>threshold]
+    if len(lessereq)==0 or len(greater)==0:
+        return set_entropy(data[label_column])
+    return set_entropy(lessereq[label_column])*(len(lessereq)/len(data))+\
+           set_entropy(greater[label_column])*(len(greater)/len(data))
+def minimum_num_attribute_entropy(data:pd.DataFrame,label_column:str,attribute:str)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `label_column:str`: The column we'll use as our labels
+    * `attribute:str`: The column we'll use as our subset-generating attribute
+    Calculates the minimum attribute entropy for a numerial attribute by bruteforcing all possible thresholds
+    """
+    possible_thresh = {point for point in data[attribute]}
+    entropies = [(num_attribute_entropy(data,label_column,attribute,thr),thr) for thr in possible_thresh]
+    mi = min(entropies)
+    return (mi[0],mi[1])
+def attribute_entropy(data:pd.DataFrame,label_column:str,attribute:str)->float:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `label_column:string`: The column we'll use as our labels
+    * `attribute:string`: The column we'll use as our subset-generating attribute
+    Calculates the Attribute Entropy for labelled set
+    """
+    if data[attribute].dtype!=object:
+        return None
+    possible_values = {value for value in data[attribute]}
+    subsets = [data[data[attribute]==value] for value in possible_values]
+    entropies = [set_entropy(subset[label_column]) for subset in subsets]
+    return sum([entropies[i]*(len(subsets[i])/len(data)) for i in range(len(subsets))])
+def best_split(data:pd.DataFrame,label_column:str)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `label_column:str`: The column we'll use as our labels
+    Calculates the best possible split. Returns (attribute,threshold/None,gain)
+    """
+    entropy = set_entropy(data[label_column])
+    attributes = [column for column in data.columns if column!=label_column]
+    entropies = [(attribute_entropy(data,label_column,attribute),None) if data[attribute].dtype == object else minimum_num_attribute_entropy(data,label_column,attribute) for attribute in attributes]
+    gains = [(entropy-ent[0],i) for i,ent in enumerate(entropies)]
+    minimum = sorted(gains,reverse=True)[0]
+    return (attributes[minimum[1]],entropies[minimum[1]][1],minimum[0])
+def generate_tree(data:pd.DataFrame,label_column:str,mindepth:int,info_thresh:float,level:int=0)->tuple:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference.
+    * `label_column:str`: The column we'll use as our labels
+    * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
+    * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    Generates a decision tree based on the given parameters, slicing the DataFrame at every node
+    """
+    if len(data) == 0:
+        return (None,None,None)
+    bs = best_split(data,label_column)
+    if level>=mindepth and bs[2]<info_thresh:
+        return (data[label_column].mode()[0],None,None)
+    children = dict()
+    if data[bs[0]].dtype == object:
+        values = {value for value in data[bs[0]]}
+        children = {value:generate_tree(data[data[bs[0]]==value],label_column,mindepth,info_thresh,level+1) for value in values}
+    else:
+        children['lessereq'] = generate_tree(data[data[bs[0]]<=bs[1]],label_column,mindepth,info_thresh,level+1)
+        children['greater'] = generate_tree(data[data[bs[0]]>bs[1]],label_column,mindepth,info_thresh,level+1)
+    return (bs[0],bs[1],children)
+def tree_score(tree:tuple,data:pd.DataFrame,label_column:str)->float:
+    return np.count_nonzero(predict_batch(tree,data)==data[label_column].to_numpy())/len(data)
+def prune_tree_score(tree:tuple,data:pd.DataFrame,label_column:str,subset:pd.DataFrame=None,root_tree:tuple=None,parent:tuple=None,childname:str=None)->tuple:
+    """
+    * `tree:tuple`: A tree
+    * `data:pd.DataFrame`: The data set we're using as our reference
+    * `label_column:str`: The column we'll use as our labels
+    Prunes a tree by score, scoring the whole tree before and after turning each node into a leaf
+    """
+    if len(data)==0 or ((type(subset)!=type(None)) and len(subset)==0):
+        return None
+    if not tree[2]:
+        return tree
+    if all([tree[2][child][2]==None for child in tree[2]]) and len({tree[2][child][0] for child in tree[2]})==1:
+        return (tree[2][next(iter(tree[2]))][0],None,None)
+    if root_tree:
+        score = tree_score(root_tree,data,label_column)
+        parent[2][childname] = (subset[label_column].mode()[0],None,None)
+        newscore = tree_score(root_tree,data,label_column)
+        if newscore>score:
+            return (subset[label_column].mode()[0],None,None)
+        else:
+            parent[2][childname] = tree
+    else:
+        root_tree=tree
+        subset = data
+    if tree[1] != None:
+        tree[2]['lessereq']=prune_tree_score(tree[2]['lessereq'],data,label_column,data[data[tree[0]]<=tree[1]],root_tree,tree,'lessereq')
+        tree[2]['greater']=prune_tree_score(tree[2]['greater'],data,label_column,data[data[tree[0]]>tree[1]],root_tree,tree,'greater')
+        if not tree[2]['lessereq'] or not tree[2]['greater']:
+                return (subset[label_column].mode()[0],None,None)
+    else:
+        for child in tree[2]:
+            nsubset = data[data[tree[0]]==child]
+            if len(nsubset) == 0:
+                return (subset[label_column].mode()[0],None,None)
+            tree[2][child]=prune_tree_score(tree[2][child],data,label_column,nsubset,root_tree,tree,child)
+    return tree
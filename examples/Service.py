@@ -0,0 +1,204 @@
+"""
+A prediction service for forests: points arrive one by one (from a local queue, stdin or a socket) and are classified in small batches.
+A batch is classified as soon as it has `max_batch` points or its first point has waited `max_delay` seconds, whichever comes first.
+
+Run `python Service.py model.c45m` to classify JSON points (one per line) from stdin, or add `--port 8000` to serve them over TCP.
+The model is a file saved by `save_model` (see Storage.py). See Load_Generator.py for benchmarking it.
+"""
+import numpy as np
+import asyncio
+import json
+import time
+import sys
+import argparse
+import signal
+from Inference import CompiledTree,load_model,predict
+
+class ForestService:
+    """
+    Classifies points with a forest as they arrive, grouping them in batches (see `run`).
+    * `forest`: The forest, compiled (see `compile_forest`)
+    * `max_batch`: The maximum amount of points in a batch
+    * `max_delay`: How long (in seconds) a point can wait for the batch to fill up
+    * `latencies`: How long (in seconds) each point took to be classified, since it arrived
+    * `batches`: The size of each batch
+    """
+    def __init__(self,forest:list,max_batch:int=256,max_delay:float=0.002):
+        if not all(isinstance(tree,CompiledTree) for tree in forest):
+            #(Only trees that aren't compiled yet need the training code)
+            from Compiled import compile_forest
+            forest = compile_forest(forest)
+        self.forest = forest
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.latencies = []
+        self.batches = []
+        self.start = None
+        self.end = None
+    async def classify(self,point:dict):
+        """
+        * `point:dict`: A data point, as {attribute:value}
+        Classifies a point (when its batch is ready). Returns its label
+        """
+        future = asyncio.get_running_loop().create_future()
+        arrival = time.perf_counter()
+        if self.start is None:
+            self.start = arrival
+        self.queue.put_nowait((point,arrival,future))
+        return await future
+    async def run(self):
+        """
+        Keeps classifying batches of points from the queue (until it's cancelled)
+        """
+        while True:
+            #We wait for a point to arrive, and it sets the deadline for its batch
+            batch = [await self.queue.get()]
+            deadline = batch[0][1]+self.max_delay
+            while len(batch)<self.max_batch:
+                #We take what's there already, and if it's not enough, we wait for more until the deadline
+                while len(batch)<self.max_batch and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                remaining = deadline-time.perf_counter()
+                if len(batch)==self.max_batch or remaining<=0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(),remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._classify(batch)
+    def _classify(self,batch:list):
+        #Classifies a batch with the forest (counting the votes for all points at once, and stopping once they're decided) and answers each point
+        points = [point for point,arrival,future in batch]
+        try:
+            labels = predict(self.forest,points,early_exit=True)
+        except Exception:
+            #Some point can't be classified (a value of the wrong type, for example), so we classify them one by one:
+            #that point gets the error and the others their labels, and the service keeps running
+            labels = [self._classify_one(point) for point in points]
+        now = time.perf_counter()
+        for (point,arrival,future),label in zip(batch,labels):
+            if not future.done():
+                if isinstance(label,Exception):
+                    future.set_exception(label)
+                else:
+                    future.set_result(label)
+            self.latencies.append(now-arrival)
+        self.batches.append(len(batch))
+        self.end = now
+    def _classify_one(self,point:dict):
+        #Classifies a single point. Returns its label, or the exception if it couldn't be classified
+        try:
+            return predict(self.forest,[point],early_exit=True)[0]
+        except Exception as error:
+            return error
+    def report(self)->dict:
+        """
+        Returns the service's statistics: how many points and batches it classified, the mean batch size,
+        the median (p50) and 99th percentile (p99) latencies in milliseconds and the throughput in points per second
+        """
+        if not self.latencies:
+            return {'points':0,'batches':0}
+        latencies = np.array(self.latencies)*1000
+        return {'points':len(latencies),'batches':len(self.batches),'mean batch':float(np.mean(self.batches)),
+                'p50 ms':float(np.percentile(latencies,50)),'p99 ms':float(np.percentile(latencies,99)),
+                'points/s':len(latencies)/max(self.end-self.start,1e-9)}
+
+def _plain(label):
+    #Labels can be NumPy values, which JSON doesn't know
+    return label.item() if isinstance(label,np.generic) else label
+
+async def serve_lines(service:ForestService,reader:asyncio.StreamReader,write):
+    """
+    * `service:ForestService`: A running service
+    * `reader:asyncio.StreamReader`: Where the points come from, as JSON objects (one per line)
+    * `write`: A function that writes a line with each point's label (as JSON), in the same order as the points
+      (or {"error":message} for the points that couldn't be read or classified)
+    Classifies the points from a stream until it ends
+    """
+    pending = asyncio.Queue()
+    async def answer():
+        #The answers are written in order, as soon as each one is ready
+        while True:
+            task = await pending.get()
+            if task is None:
+                return
+            try:
+                write(json.dumps(_plain(await task))+'\n')
+            except Exception as error:
+                write(json.dumps({'error':f"{type(error).__name__}: {error}"})+'\n')
+    answering = asyncio.ensure_future(answer())
+    async for line in reader:
+        if not line.strip():
+            continue
+        try:
+            point = json.loads(line)
+            if not isinstance(point,dict):
+                raise ValueError(f"A point must be a JSON object, not {type(point).__name__}")
+        except ValueError as error:
+            #Lines that aren't points get their error as their answer, without going to the service
+            task = asyncio.get_running_loop().create_future()
+            task.set_exception(error)
+        else:
+            task = asyncio.ensure_future(service.classify(point))
+        pending.put_nowait(task)
+    pending.put_nowait(None)
+    await answering
+
+async def _stdin_reader()->asyncio.StreamReader:
+    #A stream reader for stdin
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),sys.stdin)
+    except ValueError:
+        #Files can't be watched like pipes, so we read them in another thread
+        async def feed():
+            while line := await loop.run_in_executor(None,sys.stdin.buffer.readline):
+                reader.feed_data(line)
+            reader.feed_eof()
+        asyncio.ensure_future(feed())
+    return reader
+
+async def serve(model:str,port:int=None,max_batch:int=256,max_delay:float=0.002):
+    """
+    * `model:str`: A forest (or tree) saved by `save_model`
+    * `port:int`: The TCP port to listen on (if not given, we read from stdin and write to stdout until stdin ends)
+    * `max_batch:int`,`max_delay:float`: See `ForestService`
+    Runs the prediction service (until it's interrupted or terminated). Its statistics are written to stderr at the end
+    """
+    #Being terminated stops the service just like Ctrl+C
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    forest = load_model(model)
+    service = ForestService([forest] if isinstance(forest,CompiledTree) else forest,max_batch,max_delay)
+    running = asyncio.ensure_future(service.run())
+    try:
+        if port is None:
+            await serve_lines(service,await _stdin_reader(),sys.stdout.write)
+            sys.stdout.flush()
+        else:
+            async def connection(reader,writer):
+                await serve_lines(service,reader,lambda line: writer.write(line.encode()))
+                await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(connection,port=port)
+            async with server:
+                await server.serve_forever()
+    finally:
+        running.cancel()
+        print(json.dumps(service.report()),file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classifies JSON points (one per line) with a saved forest, in micro-batches")
+    parser.add_argument('model')
+    parser.add_argument('--port',type=int)
+    parser.add_argument('--max-batch',type=int,default=256)
+    parser.add_argument('--max-delay',type=float,default=0.002)
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(arguments.model,arguments.port,arguments.max_batch,arguments.max_delay))
+    except (KeyboardInterrupt,asyncio.CancelledError):
+        pass
@@ -0,0 +1,62 @@
+"""
+Saving trees and forests to disk as flat arrays, so they can be loaded (memory-mapped) without rebuilding any Python objects.
+
+The file starts with the magic bytes `C45M`, the format version (a 4 byte unsigned integer) and the header size (8 bytes),
+all little-endian. The header is JSON, with the attribute, value and label tables, how many nodes and branches each tree has
+and where each array starts. Then come the arrays of all trees (see `CompiledTree`), each one aligned to 64 bytes:
+every field is saved as one array with the trees one after another, so each tree's arrays are slices of them.
+"""
+import numpy as np
+import json
+import struct
+from Compiled import CompiledTree,compile_tree,compile_forest
+#(Loading only needs NumPy, so it's in Inference.py along with the format's constants)
+from Inference import MAGIC,VERSION,FIELDS,ALIGNMENT,load_model
+
+def _plain(value):
+    #JSON only knows Python's types, so NumPy's are converted
+    if isinstance(value,np.generic):
+        value = value.item()
+    if value is not None and not isinstance(value,(str,int,float,bool)):
+        raise TypeError(f"Can't save the value {value!r} ({type(value).__name__}) in a model file")
+    return value
+
+def save_model(model,path:str):
+    """
+    * `model`: A tree, a forest, a `CompiledTree` or a list of trees compiled by `compile_forest`
+    * `path:str`: Where to save it
+    Saves a tree or a forest as flat arrays (see `load_model`)
+    """
+    #Trees are compiled first (forests sharing the same tables)
+    if isinstance(model,CompiledTree):
+        kind,trees = 'tree',[model]
+    elif isinstance(model,tuple):
+        kind,trees = 'tree',[compile_tree(model)]
+    else:
+        kind = 'forest'
+        trees = list(model) if all(isinstance(tree,CompiledTree) for tree in model) else compile_forest(model)
+    if len(trees) and any(tree.attributes is not trees[0].attributes or tree.classes is not trees[0].classes for tree in trees):
+        raise ValueError("The trees in a forest must share their tables (see compile_forest)")
+    first = trees[0] if trees else CompiledTree(*[np.zeros(0)]*6,[],dict(),[])
+    header = {'kind':kind,
+              'attributes':first.attributes,
+              'values':{attribute:[_plain(value) for value in values] for attribute,values in first.values.items()},
+              'classes':[_plain(label) for label in first.classes],
+              'nodes':[len(tree) for tree in trees],
+              'branches':[len(tree.branches) for tree in trees],
+              'arrays':dict()}
+    #We concatenate each field and find where it'll be in the file (after the header, which we have to measure first)
+    arrays = {name:np.concatenate([getattr(tree,name) for tree in trees]).astype(dtype) if trees else np.zeros(0,dtype=dtype) for name,dtype in FIELDS}
+    offset = 0
+    for name,dtype in FIELDS:
+        header['arrays'][name] = {'dtype':dtype,'offset':offset,'length':len(arrays[name])}
+        offset += -(-arrays[name].nbytes//ALIGNMENT)*ALIGNMENT
+    encoded = json.dumps(header).encode()
+    start = -(-(len(MAGIC)+12+len(encoded))//ALIGNMENT)*ALIGNMENT
+    with open(path,'wb') as file:
+        file.write(MAGIC+struct.pack('<IQ',VERSION,len(encoded))+encoded)
+        for name,dtype in FIELDS:
+            file.seek(start+header['arrays'][name]['offset'])
+            file.write(arrays[name].tobytes())
+        #(The file has to be long enough for the last array, even if it's empty)
+        file.truncate(start+offset)
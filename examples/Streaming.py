@@ -0,0 +1,281 @@
+"""
+Growing trees from data sets that don't fit in memory.
+The data is read in chunks: once for finding the bins (see `generate_tree_binned`), and then once for each level of the tree,
+counting how many points of each class fall in each bin for every node in that level. Only those counts are kept in memory
+(after the first level, the chunks are read from a temporary file with the binned data set instead, which is faster).
+"""
+import pandas as pd
+import numpy as np
+import math
+import tempfile
+from Part4 import histogram_best_split
+from Inference import value_key
+
+class QuantileSketch:
+    """
+    A summary of a numerical column read in chunks, for finding its quantiles without keeping all of it in memory.
+    * `values`,`weights`: The arrays of values we kept and how many points each value in them stands for
+    * `count`,`maximum`: How many points were added and the biggest value
+    * `distinct`: The distinct values, while there's no more than `limit` of them (None after that)
+
+    All values are kept until there's more than `capacity` of them, so up to there the quantiles are exact (the same as `bin_data`'s).
+    After that, it keeps only evenly spaced ones, each standing for several points.
+    """
+    def __init__(self,capacity:int,limit:int):
+        self.capacity = capacity
+        self.limit = limit
+        self.values = []
+        self.weights = []
+        self.count = 0
+        self.maximum = -math.inf
+        self.distinct = np.array([])
+    def add(self,values:np.ndarray):
+        """
+        * `values:np.ndarray`: Some more of the column's values
+        Adds values to the sketch
+        """
+        if len(values)==0:
+            return
+        self.count += len(values)
+        self.maximum = max(self.maximum,values.max())
+        if self.distinct is not None:
+            self.distinct = np.union1d(self.distinct,values) if len(self.distinct) else np.unique(values)
+            if len(self.distinct)>self.limit:
+                self.distinct = None
+        self.values.append(values)
+        self.weights.append(1)
+        if sum(len(kept) for kept in self.values)>self.capacity:
+            #We keep half of our capacity, so we don't have to do this at every chunk
+            values,cumulative = self._sorted()
+            size = self.capacity//2
+            keep = np.minimum(np.searchsorted(cumulative,(np.arange(size)+0.5)*cumulative[-1]/size,side='right'),len(values)-1)
+            self.values = [values[keep]]
+            self.weights = [cumulative[-1]/size]
+    def _sorted(self)->tuple:
+        #All kept values in ascending order, and how many points there are up to each one
+        values = np.concatenate(self.values)
+        order = np.argsort(values,kind='stable')
+        weights = np.repeat(self.weights,[len(kept) for kept in self.values])
+        return (values[order],np.cumsum(weights[order]))
+    def edges(self,bins:int)->np.ndarray:
+        """
+        * `bins:int`: The maximum number of bins
+        Returns the bin edges for the column, just like `bin_data` finds them
+        """
+        if self.distinct is not None and len(self.distinct)<=bins:
+            return self.distinct
+        values,cumulative = self._sorted()
+        #The point at each position is the first value whose weights add up past it
+        positions = np.ceil(np.arange(1,bins+1)*self.count/bins).astype(int)-1
+        found = values[np.minimum(np.searchsorted(cumulative,positions,side='right'),len(values)-1)]
+        #The last edge is always the biggest value, so every point has a bin
+        found[-1] = self.maximum
+        return np.unique(found)
+
+def csv_chunks(path:str,chunksize:int=100000):
+    """
+    * `path:str`: A CSV file
+    * `chunksize:int`: How many rows to read at a time
+    Returns a function that reads the file in chunks (every time it's called)
+    """
+    return lambda: pd.read_csv(path,chunksize=chunksize)
+
+def array_chunks(columns:dict,chunksize:int=100000):
+    """
+    * `columns:dict`: The data set's columns as arrays, for example memory-mapped with `np.load(path,mmap_mode='r')`
+    * `chunksize:int`: How many rows to read at a time
+    Returns a function that reads the columns in chunks (every time it's called)
+    """
+    length = len(next(iter(columns.values())))
+    return lambda: (pd.DataFrame({column:np.asarray(array[start:start+chunksize]) for column,array in columns.items()}) for start in range(0,length,chunksize))
+
+def _scan(chunks,label_column:str,bins:int,capacity:int)->tuple:
+    #Reads the data set once, finding the labels, the categorical attributes' values and the numerical attributes' bins
+    classes = None
+    categorical = dict()
+    sketches = dict()
+    for chunk in chunks():
+        if classes is None:
+            classes = set()
+            for attribute in chunk.columns:
+                if attribute==label_column:
+                    continue
+                if chunk[attribute].dtype == object:
+                    categorical[attribute] = set()
+                else:
+                    sketches[attribute] = QuantileSketch(capacity,bins)
+        classes.update(pd.unique(chunk[label_column]))
+        for attribute in categorical:
+            categorical[attribute].update(pd.unique(chunk[attribute]))
+        for attribute in sketches:
+            #Every chunk has to agree on which attributes are categorical (reading the whole file at once would make it so)
+            if chunk[attribute].dtype == object:
+                raise ValueError(f"The attribute {attribute} has categorical values after the first chunk")
+            #(We copy the values, or they'd keep the whole chunk in memory)
+            sketches[attribute].add(chunk[attribute].to_numpy().copy())
+    if classes is None:
+        return None
+    #Everything is sorted, just like in `encode_data` and `bin_data` (with missing values last, as a single value)
+    values = {attribute:pd.Index([value_key(value) for value in found]).unique().sort_values() for attribute,found in categorical.items()}
+    edges = {attribute:sketch.edges(bins) for attribute,sketch in sketches.items()}
+    attributes = [attribute for attribute in chunk.columns if attribute!=label_column]
+    return (attributes,pd.Index(sorted(classes)),values,edges)
+
+def _bin_chunk(chunk:pd.DataFrame,label_column:str,attributes:list,classes:pd.Index,values:dict,edges:dict)->tuple:
+    #Encodes a chunk as a matrix with each point's bin (or value, for categorical attributes) for every attribute, and its label
+    matrix = np.empty((len(chunk),len(attributes)),dtype=np.int32)
+    for i,attribute in enumerate(attributes):
+        if attribute in values:
+            matrix[:,i] = values[attribute].get_indexer(chunk[attribute])
+        else:
+            matrix[:,i] = np.searchsorted(edges[attribute],chunk[attribute].to_numpy(),side='left')
+    return (matrix,classes.get_indexer(chunk[label_column]))
+
+class _Spill:
+    #A temporary file with the binned data set (its matrix, with the labels as an extra column)
+    def __init__(self,width:int):
+        self.file = tempfile.TemporaryFile()
+        self.width = width
+        self.rows = None
+
+def _binned_chunks(chunks,spill:_Spill,label_column:str,attributes:list,classes:pd.Index,values:dict,edges:dict):
+    #Reads the data set as (matrix,labels) chunks (see `_bin_chunk`). The first time, we read the original chunks and write the
+    #binned ones to the spill file, which is a lot smaller and faster to read, so from then on we read them from there
+    if spill.rows is None:
+        rows = 0
+        for chunk in chunks():
+            matrix,labels = _bin_chunk(chunk,label_column,attributes,classes,values,edges)
+            np.column_stack((matrix,labels)).astype(np.int32).tofile(spill.file)
+            rows += len(chunk)
+            yield (matrix,labels)
+        spill.rows = rows
+        return
+    spill.file.seek(0)
+    for start in range(0,spill.rows,2**16):
+        binned = np.fromfile(spill.file,dtype=np.int32,count=min(2**16,spill.rows-start)*spill.width).reshape(-1,spill.width)
+        yield (binned[:,:-1],binned[:,-1])
+
+def _route(nodes:dict,branches:list,matrix:np.ndarray)->np.ndarray:
+    #Sends the points down the part of the tree we've grown so far. Returns the node each one stops at
+    feature = np.array(nodes['feature'],dtype=np.int32)
+    cut,left,right = np.array(nodes['cut']),np.array(nodes['left']),np.array(nodes['right'])
+    branches = np.array(branches,dtype=np.int64)
+    node = np.zeros(len(matrix),dtype=np.int64)
+    active = np.arange(len(matrix))
+    while len(active):
+        current = node[active]
+        split = feature[current]>=0
+        active,current = active[split],current[split]
+        x = matrix[active,feature[current]]
+        #Numerical splits keep the bin they cut at, categorical ones have a cut of -1
+        child = np.where(x<=cut[current],left[current],right[current])
+        categorical = cut[current]<0
+        child[categorical] = branches[left[current[categorical]]+x[categorical]]
+        node[active] = child
+        active = active[child>=0]
+    return node
+
+def stream_tree(chunks,label_column:str,mindepth:int,info_thresh:float,bins:int=256,chunksize:int=100000,capacity:int=2**20,level:int=0)->tuple:
+    """
+    * `chunks`: A CSV file's path, or a function that returns the data set as an iterable of DataFrames (see `csv_chunks` and `array_chunks`)
+    * `label_column:str`: The column we'll use as our labels
+    * `mindepth:int`: The minimum depth for the tree (up until which it ignores the minimum information gain threshold).
+    * `info_trhesh:float`: The minimum information gain threshold. After the minimum depth, if the next split's gain is smaller than this, it'll stop splitting
+    * `bins:int`: The maximum number of bins for each numerical attribute
+    * `chunksize:int`: How many rows to read at a time from a CSV file
+    * `capacity:int`: How many values of each numerical attribute we can keep for finding the bins (see `QuantileSketch`)
+    Generates a tree reading the data set in chunks, one level at a time, so it never has to be in memory all at once.
+    As long as there's no more than `capacity` points, it's the same tree `generate_tree(...,bins=bins)` makes (and so, the exact one,
+    if no numerical attribute has more than `bins` distinct values)
+    """
+    if isinstance(chunks,str):
+        chunks = csv_chunks(chunks,chunksize)
+    layout = _scan(chunks,label_column,bins,capacity)
+    #If there's nothing there, we can't do much
+    if layout is None:
+        return (None,None,None)
+    attributes,classes,values,edges = layout
+    sizes = [len(edges[attribute]) if attribute in edges else len(values[attribute]) for attribute in attributes]
+    #The tree we've grown so far, as arrays (like a `CompiledTree`, but with bins instead of thresholds)
+    nodes = {'feature':[-1],'cut':[0],'left':[-1],'right':[-1]}
+    branches = []
+    #What we know about each node: its label if it's a leaf, or its split and children
+    grown = dict()
+    #The nodes in the current level, and (parent's histograms,siblings) for those whose counts we'll get from their parent
+    frontier = [0]
+    derived = dict()
+    histograms = dict()
+    #The data set, binned, for all passes after the first one
+    spill = _Spill(len(attributes)+1)
+    while frontier:
+        #We read the data set again, counting the classes in each bin only for the nodes we have to
+        counted = [node for node in frontier if node not in derived]
+        if counted:
+            slots = np.full(len(nodes['feature']),-1)
+            slots[counted] = np.arange(len(counted))
+            counts = [np.zeros(len(counted)*size*len(classes),dtype=np.int64) for size in sizes]
+            for matrix,labels in _binned_chunks(chunks,spill,label_column,attributes,classes,values,edges):
+                slot = slots[_route(nodes,branches,matrix)]
+                matrix,labels,slot = matrix[slot>=0],labels[slot>=0],slot[slot>=0]
+                for i,size in enumerate(sizes):
+                    counts[i] += np.bincount((slot*size+matrix[:,i])*len(classes)+labels,minlength=len(counts[i]))
+            for s,node in enumerate(counted):
+                histograms[node] = {attribute:counts[i].reshape(len(counted),sizes[i],len(classes))[s] for i,attribute in enumerate(attributes)}
+        #The biggest child in each split gets its parent's counts minus its siblings'
+        for node,(parent,siblings) in derived.items():
+            histograms[node] = {attribute:parent[attribute]-sum(histograms[sibling][attribute] for sibling in siblings) for attribute in attributes}
+        derived = dict()
+        nextfrontier = []
+        for node in frontier:
+            histogram = histograms.pop(node)
+            totals = histogram[attributes[0]].sum(axis=0)
+            #Finds the best split
+            bs = histogram_best_split(histogram,edges)
+            #If it's below the minimum depth and the split isn't worth it
+            if level>=mindepth and bs[2]<info_thresh:
+                #Return the most common label and become a leaf
+                grown[node] = (classes[np.argmax(totals)],)
+                continue
+            feature = attributes.index(bs[0])
+            #We find each child's size from our own counts
+            if bs[0] in edges:
+                cut = np.searchsorted(edges[bs[0]],bs[1])
+                counts = histogram[bs[0]].sum(axis=1)
+                children = [('lessereq',counts[:cut+1].sum()),('greater',counts[cut+1:].sum())]
+            else:
+                cut = -1
+                counts = histogram[bs[0]].sum(axis=1)
+                children = [(values[bs[0]][code],counts[code]) for code in np.flatnonzero(counts)]
+            ids = list(range(len(nodes['feature']),len(nodes['feature'])+len(children)))
+            for key,default in (('feature',-1),('cut',0),('left',-1),('right',-1)):
+                nodes[key].extend([default]*len(children))
+            nodes['feature'][node] = feature
+            nodes['cut'][node] = cut
+            if cut>=0:
+                nodes['left'][node],nodes['right'][node] = ids
+            else:
+                nodes['left'][node] = len(branches)
+                branches.extend([-1]*sizes[feature])
+                for (value,size),child in zip(children,ids):
+                    branches[nodes['left'][node]+values[bs[0]].get_loc(value)] = child
+            grown[node] = (bs[0],bs[1],[(key,child) for (key,size),child in zip(children,ids)])
+            #Empty children are done already, the others go to the next level
+            biggest = max(range(len(children)),key=lambda i: children[i][1])
+            for i,((key,size),child) in enumerate(zip(children,ids)):
+                if size==0:
+                    grown[child] = (None,)
+                    continue
+                nextfrontier.append(child)
+                if i==biggest:
+                    derived[child] = (histogram,[sibling for sibling,(k,s) in zip(ids,children) if sibling!=child and s>0])
+        frontier = nextfrontier
+        level += 1
+    spill.file.close()
+    return _assemble(grown,0)
+
+def _assemble(grown:dict,node:int)->tuple:
+    #Builds the tree's tuples from what we know about each node
+    if len(grown[node])==1:
+        return (grown[node][0],None,None)
+    attribute,threshold,children = grown[node]
+    return (attribute,threshold,{key:_assemble(grown,child) for key,child in children})
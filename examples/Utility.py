@@ -1,5 +1,7 @@
-import matplotlib.pyplot as plt
 def print_tree(tree,level=0,x=(0,1),y=(0,1),genfigures=False):
+    #matplotlib takes a while to import, so we only do it for the figures
+    if genfigures:
+        import matplotlib.pyplot as plt
     lx=gx=x
     ly=gy=y
     if not tree[2]:
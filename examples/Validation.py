@@ -0,0 +1,145 @@
+"""
+Model selection: evaluates every combination of `generate_tree`'s (and pruning's) parameters on repeated holdouts or k folds,
+with the folds spread over worker processes, and returns a table with each fold's score and timings.
+
+The data set is encoded once and shared with the workers (see `share_data`), and the folds are just lists of its rows.
+Each worker grows a tree only once for the combinations that differ only in their pruning, keeps a split cache
+(see Caching.py) for the ones that only differ in `mindepth`/`info_thresh`, and scores with batch prediction.
+All random numbers come from the seed, so the table is the same for any number of processes.
+"""
+import pandas as pd
+import numpy as np
+import time
+import copy
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from Part5 import generate_tree,annotate_tree
+from ExtraPart1 import prune_tree,tree_score
+from Compiled import compile_tree
+from Dataset import EncodedData,encode_data,share_data,attach_data,shared_data
+from Caching import SplitCache,caching
+
+def parameter_grid(**options)->list:
+    """
+    * `options`: Each parameter's possible values, as lists. They can be `generate_tree`'s (`mindepth`,`info_thresh`,`presort`,`bins`
+      and `max_leaves`), `prune` (None, 'score' or 'entropy') and `threshold` (for entropy pruning)
+    Returns every combination of the values, as dicts
+    """
+    return [dict(zip(options,values)) for values in itertools.product(*options.values())]
+
+def holdout_splits(rows:int,repeats:int,train_fraction:float=0.25,seed:int=0)->list:
+    """
+    * `rows:int`: The data set's size
+    * `repeats:int`: How many random splits we'll make
+    * `train_fraction:float`: About how many of the rows go to training in each split (each row is picked with this probability)
+    * `seed:int`: The seed for the splits
+    Makes random training/test splits (like `Main_Examples.test`). Returns a list of (training rows,test rows)
+    """
+    splits = []
+    for repeat in range(repeats):
+        random = np.random.default_rng([seed,repeat]).random(rows)<train_fraction
+        splits.append((np.flatnonzero(random),np.flatnonzero(~random)))
+    return splits
+
+def kfold_splits(rows:int,k:int=5,seed:int=0)->list:
+    """
+    * `rows:int`: The data set's size
+    * `k:int`: How many folds there'll be
+    * `seed:int`: The seed for shuffling the rows
+    Splits the rows into k folds, each one being the test set once (and the others its training set). Returns a list of (training rows,test rows)
+    """
+    folds = np.array_split(np.random.default_rng(seed).permutation(rows),k)
+    return [(np.sort(np.concatenate(folds[:i]+folds[i+1:])),np.sort(fold)) for i,fold in enumerate(folds)]
+
+def _evaluate(data:EncodedData,fold:int,train:np.ndarray,test:np.ndarray,combinations:list,prune_fraction:float,seed:int)->list:
+    #Evaluates some combinations on a fold. Returns a row of the results table for each one
+    #The combinations that prune keep part of the training rows for it (always the same ones for a fold)
+    shuffled = np.random.default_rng([seed,fold]).permutation(train)
+    cut = len(shuffled)-int(len(shuffled)*prune_fraction)
+    grow,pruning = np.sort(shuffled[:cut]),data.subset(np.sort(shuffled[cut:]))
+    testing = data.subset(test)
+    #The trees (and their annotated copies, for entropy pruning) we've grown, by their parameters
+    trees = dict()
+    annotated = dict()
+    results = []
+    with caching(SplitCache()):
+        for index,parameters in combinations:
+            options = {name:value for name,value in parameters.items() if name not in ('prune','threshold')}
+            method = parameters.get('prune')
+            key = (tuple(sorted(options.items())),method is not None)
+            if key not in trees:
+                start = time.perf_counter()
+                tree = generate_tree(data.subset(grow if method else train),data.label_column,options.pop('mindepth',2),options.pop('info_thresh',0.05),**options)
+                trees[key] = (tree,time.perf_counter()-start)
+            tree,fitting = trees[key]
+            start = time.perf_counter()
+            if method == 'entropy':
+                #Entropy pruning only needs the pruning rows' class counts, so they're counted once for all thresholds
+                if key not in annotated:
+                    annotated[key] = annotate_tree(tree,pruning,data.label_column)
+                threshold = parameters.get('threshold')
+                tree = prune_tree(annotated[key],threshold=1 if threshold is None else threshold)
+            elif method == 'score':
+                tree = prune_tree(copy.deepcopy(tree),pruning,data.label_column,'score')
+            pruning_time = time.perf_counter()-start
+            start = time.perf_counter()
+            compiled = compile_tree(tree)
+            score = tree_score(compiled,testing,data.label_column)
+            results.append({'combination':index,**parameters,'fold':fold,'training rows':len(grow) if method else len(train),'test rows':len(test),
+                            'score':score,'nodes':len(compiled),'fit seconds':fitting,'prune seconds':pruning_time,'score seconds':time.perf_counter()-start})
+    return results
+
+def _evaluate_shared(task:tuple)->list:
+    #Runs on the worker processes, with the shared data set
+    return _evaluate(shared_data(),*task)
+
+def cross_validate(data:pd.DataFrame,label_column:str,combinations:list,splits:list,n_jobs:int=1,prune_fraction:float=0.25,seed:int=0)->pd.DataFrame:
+    """
+    * `data:pd.DataFrame`: The data set we're using as our reference (or an `EncodedData`)
+    * `label_column:str`: The column we'll use as our labels
+    * `combinations:list`: The parameter combinations we'll evaluate, as dicts (see `parameter_grid`)
+    * `splits:list`: The (training rows,test rows) of each fold (see `holdout_splits` and `kfold_splits`)
+    * `n_jobs:int`: How many processes will evaluate folds at the same time
+    * `prune_fraction:float`: How much of each fold's training rows the combinations that prune keep for pruning
+    * `seed:int`: The seed for choosing the pruning rows
+    Grows, prunes and scores a tree for every combination on every fold. Returns a table with a row for each one: the combination
+    (its position and parameters), the fold, how many rows it was trained and tested with, its score and size (in nodes)
+    and how long it took to grow (trees shared by combinations that only prune differently count for all of them), prune and score it
+    """
+    if not isinstance(data,EncodedData):
+        data = encode_data(data,label_column)
+    combinations = list(enumerate(combinations))
+    #Each fold's combinations are split in as many tasks as it takes to keep all processes busy
+    #(the ones that only differ in their pruning stay together, so they share their trees)
+    groups = dict()
+    for combination in combinations:
+        groups.setdefault(repr(sorted((name,value) for name,value in combination[1].items() if name not in ('prune','threshold'))),[]).append(combination)
+    groups = list(groups.values())
+    chunks = max(1,min(len(groups),-(-n_jobs//len(splits))))
+    tasks = [(fold,train,test,[combination for group in groups[part::chunks] for combination in group],prune_fraction,seed)
+             for fold,(train,test) in enumerate(splits) for part in range(chunks)]
+    if n_jobs>1:
+        blocks,shared = share_data(data)
+        try:
+            with ProcessPoolExecutor(n_jobs,initializer=attach_data,initargs=shared) as pool:
+                results = list(pool.map(_evaluate_shared,tasks))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    else:
+        results = [_evaluate(data,*task) for task in tasks]
+    return pd.DataFrame([row for rows in results for row in rows]).sort_values(['combination','fold'],ignore_index=True)
+
+def summarize(results:pd.DataFrame)->pd.DataFrame:
+    """
+    * `results:pd.DataFrame`: A table made by `cross_validate`
+    Averages each combination's folds: its mean score (and standard deviation), nodes and total time. Returns them sorted from the best score
+    """
+    parameters = [column for column in results.columns if column not in ('fold','training rows','test rows','score','nodes','fit seconds','prune seconds','score seconds')]
+    results = results.assign(seconds=results['fit seconds']+results['prune seconds']+results['score seconds'])
+    #(Every fold has the same parameters, so we take the first one's, keeping them even if they're None, which 'first' would skip)
+    summary = results.groupby('combination').agg(**{name:(name,lambda values: values.iloc[0]) for name in parameters if name!='combination'},
+                                                 score=('score','mean'),deviation=('score','std'),nodes=('nodes','mean'),seconds=('seconds','sum'))
+    return summary.sort_values('score',ascending=False,kind='stable')